@@ -9,19 +9,510 @@
 7、执行【订单中心订单_佛山市图书馆】的数据
 8、匹配中图错入格口的订单数据
 '''
+from __future__ import annotations
 import os
 import shutil
 import argparse
 import time
+import json
+import sqlite3
+import fnmatch
+import re
+import html
+import zipfile
+import logging
+import sys
+import hashlib
+import inspect
 from typing import Union
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 from pathlib import Path
-import pandas as pd
-from openpyxl import load_workbook
-from openpyxl.styles import PatternFill
+from xml.etree import ElementTree
+from excelIO import (lazy_import, read_excel_cached, write_excel, iter_sheet_rows, FrameStream,
+                     FRAME_MEMORY, record_frame, frame_memory_report, mem_report_enabled)
+# pandas/numpy在首次使用时才加载 , openpyxl在用到的函数内导入（重命名、执行计划等不读写表格的操作无需等待导入）
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
 # 全局忽略openpyxl警告 , 自定义开启或关闭
 import warnings
-from openpyxl.styles.stylesheet import Stylesheet
-warnings.filterwarnings("ignore", category=UserWarning, module=Stylesheet.__module__)
+warnings.filterwarnings("ignore", category=UserWarning, module="openpyxl.styles.stylesheet")
+
+"""
+运行选项（由命令行参数设置 , 进程池中的子进程在创建 PipelineController 时同步）
+"""
+RUN_OPTIONS = {
+    'explain_filters': False,  # 打印筛选条件的执行顺序与选择率
+    'progress': False,         # 显示逐行处理的进度条
+    'jobs': 1,                 # 多文件函数（如S0、S6）并行处理文件的进程数
+    'stream_rows': 0           # 大于0时筛选（S3、S5等）按此行数分块读取 , 内存占用与文件大小无关
+}
+
+# ====================== 日志与进度 ======================
+log = logging.getLogger("reName")
+
+def setup_logging(quiet: bool = False, log_file: str = None):
+    """
+    配置日志输出
+    终端只输出步骤级信息（--quiet 时只输出警告与错误）, 逐行明细（如每个标黄/未匹配单号）仅在指定 --log-file 时写入日志文件
+    """
+    log.handlers.clear()
+    log.propagate = False
+    console = logging.StreamHandler(sys.stdout)
+    console.setLevel(logging.WARNING if quiet else logging.INFO)
+    console.setFormatter(logging.Formatter("%(message)s"))
+    log.addHandler(console)
+    log.setLevel(logging.INFO)
+    if log_file:
+        file_handler = logging.FileHandler(log_file, encoding='utf-8')
+        file_handler.setLevel(logging.DEBUG)
+        file_handler.setFormatter(logging.Formatter("%(asctime)s [%(processName)s] %(levelname)s %(message)s"))
+        log.addHandler(file_handler)
+        log.setLevel(logging.DEBUG)
+
+class ProgressBar:
+    """
+    终端进度条（--progress 时启用 , 输出到stderr）
+    按最小刷新间隔节流 , 显示 已处理行数 / 速度（行/秒）/ 预计剩余时间
+    """
+    def __init__(self, total: int, desc: str = "", interval: float = 0.2, width: int = 30):
+        self.total = total or 0
+        self.desc = desc
+        self.interval = interval
+        self.width = width
+        self.count = 0
+        self.enabled = RUN_OPTIONS['progress'] and self.total > 0
+        self.start = self.last = time.monotonic()
+
+    def update(self, n: int = 1):
+        self.count += n
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        if now - self.last >= self.interval:
+            self.last = now
+            self.render(now)
+
+    def render(self, now):
+        elapsed = now - self.start
+        rate = self.count / elapsed if elapsed > 0 else 0.0
+        eta = (self.total - self.count) / rate if rate > 0 else 0.0
+        filled = min(self.width, int(self.width * self.count / self.total))
+        sys.stderr.write(f"\r{self.desc} [{'#' * filled}{'-' * (self.width - filled)}] "
+                         f"{self.count}/{self.total} 行 | {rate:,.0f} 行/秒 | 剩余 {max(eta, 0):.0f}s")
+        sys.stderr.flush()
+
+    def close(self):
+        if self.enabled:
+            self.render(time.monotonic())
+            sys.stderr.write("\n")
+            sys.stderr.flush()
+
+"""
+当前步骤的处理统计（读取行数、匹配/未匹配行数等）, 步骤结束时由控制器汇总为JSON摘要
+"""
+STEP_STATS = {}
+
+def count_rows(**counts):
+    """累加当前步骤的处理统计"""
+    for key, value in counts.items():
+        STEP_STATS[key] = STEP_STATS.get(key, 0) + int(value)
+
+def step_status(result) -> str:
+    """步骤函数返回值对应的摘要状态（返回 {'status': 'error', ...} 的任务视为失败 , 如S11、S12的对齐任务）"""
+    return "failed" if isinstance(result, dict) and result.get('status') == 'error' else "ok"
+
+def step_summary(step: str, elapsed: float, status: str = "ok", stats: dict = None) -> dict:
+    """输出步骤结束时的JSON摘要（终端与日志文件）"""
+    summary = {'step': step, 'status': status, 'elapsed': round(elapsed, 3)}
+    summary.update(STEP_STATS if stats is None else stats)
+    log.info(f"📋 {json.dumps(summary, ensure_ascii=False)}")
+    return summary
+
+# ====================== 运行期产物仓库（步骤间内存传递DataFrame） ======================
+class ArtifactStore:
+    """
+    单次流水线运行内的产物仓库 , 以文件名作为产物的逻辑名称
+    上游步骤写出的表格同时发布到仓库 , 同一次运行中读取同名文件的下游步骤直接读取内存数据 , 省去xlsx的重新解析
+    会被本次运行中下游步骤消费的中间文件（INTERMEDIATE_FILES）延迟到本次运行结束时写出 , --materialize 时生成后立即写出
+    """
+    def __init__(self):
+        self.frames = {}        # 文件名 → DataFrame
+        self.wanted = set()     # 本次运行中会被下游步骤读取的文件
+        self.deferred = set()   # 本次运行结束时才写出的中间文件
+        self.published = {}     # 当前步骤新发布的产物（进程池模式下回传主进程）
+
+    def reset(self, wanted=(), deferred=(), frames=None):
+        self.frames = dict(frames or {})
+        self.wanted = set(wanted)
+        self.deferred = set(deferred)
+        self.published = {}
+
+    def publish(self, path, df):
+        """发布产物（仅保留下游步骤需要的表格）"""
+        name = Path(path).name
+        if name in self.wanted:
+            self.frames[name] = df
+            self.published[name] = df
+
+    def lookup(self, path):
+        """
+        查找产物 , 找不到返回None
+        只按文件名精确匹配（人工确认后改名得到的文件 , 如 sys-ispay.xlsx , 总是从磁盘读取 , 见 MANUAL_RENAMES）
+        """
+        df = self.frames.get(Path(path).name)
+        if df is None:
+            return None
+        # 与重新读取文件一致：行索引从0开始连续编号
+        return df.reset_index(drop=True)
+
+    def should_write(self, path):
+        return Path(path).name not in self.deferred
+
+    def write_deferred(self):
+        """写出延迟落盘的中间文件（本次运行中未生成的跳过）, 返回写出的文件名"""
+        written = []
+        for name in sorted(self.deferred):
+            if name in self.frames:
+                write_excel(self.frames[name], name)
+                written.append(name)
+        return written
+
+ARTIFACTS = ArtifactStore()
+
+# ====================== 工作簿读取缓存（同一次运行中每个工作簿只解析一次） ======================
+"""
+读取时去除的表尾汇总行（邮政导出的账单末尾带有合计行 , 读取时即去除 , 无需S0改写原始文件）
+文件名通配符 → 判定规则：
+    labels       -- 以这些文本开头的表尾行才视为汇总行（没有标签的末行即使缺少快递单号也是正常数据）
+    label_column -- 标签所在的列（未指定时检查整行）
+    key_column   -- 同时要求该列为空（汇总行没有快递单号）
+    max_rows     -- 最多去除的表尾行数
+已执行过S0的文件末行为正常数据 , 不会被重复去除
+"""
+EMS_BILL_TRAILER = {'label_column': '序号', 'key_column': '快递单号', 'labels': ('合计', '总计'), 'max_rows': 1}
+TRAILER_RULES = {
+    '3513*.xlsx': EMS_BILL_TRAILER,
+    '3404*.xlsx': EMS_BILL_TRAILER,
+    'ems-ispay-3513.xlsx': EMS_BILL_TRAILER,
+    'ems-nopay-3404.xlsx': EMS_BILL_TRAILER
+}
+
+def trailer_rule(path):
+    """获取文件适用的表尾汇总行规则（无规则返回None）"""
+    name = Path(path).name
+    return next((rule for pattern, rule in TRAILER_RULES.items() if fnmatch.fnmatch(name, pattern)), None)
+
+def trim_trailer(df, rule):
+    """按规则去除表尾汇总行（读取时表尾的空行已被去除）"""
+    key_column, label_column = rule.get('key_column'), rule.get('label_column')
+    labels = tuple(rule.get('labels', ()))
+    end = len(df)
+    while end > 0 and len(df) - end < rule.get('max_rows', 1):
+        row = df.iloc[end - 1]
+        label_cells = [row[label_column]] if label_column in df.columns else row
+        labelled = bool(labels) and any(isinstance(v, str) and v.strip().startswith(labels) for v in label_cells)
+        key_blank = key_column not in df.columns or pd.isna(row[key_column]) or str(row[key_column]).strip() == ''
+        if not (labelled and key_blank):
+            break
+        end -= 1
+    return df.iloc[:end] if end < len(df) else df
+
+"""
+已知表格的列类型（读取时按此转换 , 不再由pandas按内容推断）
+    category       -- 取值较少的文本列（订单状态、支付类型、图书馆名称等 , 按 > < 筛选时按原文本比较）
+    str            -- 编号类文本列（纯数字的编号同样按文本保存 , 账单的快递单号可能含字母）
+    datetime64[us] -- 时间列
+    Int64          -- 金额（分）、标识等整数列（可为空）
+订单表的快递单号保持文件中的数值类型（筛选条件按数值比较 , 如 快递单号 != 0 ; 比对时另行按文本读取）
+转换失败（如金额列出现文本或小数、时间列无法解析）或读取整表时缺少声明的列 , 视为表格结构变化 , 读取即报错
+"""
+PLATFORM_ORDER_SCHEMA = {
+    '借还书订单号': 'str',
+    '流水订单号': 'str',
+    '图书馆名称': 'category',
+    '订单创建时间': 'datetime64[us]',
+    '订单状态': 'category',
+    '订单类型': 'category',
+    '支付类型': 'category',
+    '实付金额-单位为分': 'Int64',
+    '是否需要邮费': 'category',
+    '收件市': 'category',
+    '区域类型': 'category',
+    '区域标识': 'Int64'
+}
+ORDER_CENTER_SCHEMA = {
+    '借书者id': 'str',
+    '发起应用方订单id': 'str',
+    '承接应用方订单id': 'str',
+    '发起应用名称': 'category',
+    '承接应用名称': 'category',
+    '所属图书馆名称': 'category',
+    '订单类型': 'category',
+    '支付订单号': 'str',
+    '创建时间': 'datetime64[us]',
+    '订单状态': 'category',
+    '支付类型': 'category',
+    '应付金额': 'Int64'
+}
+EMS_BILL_SCHEMA = {
+    '序号': 'Int64',
+    '产品': 'category',
+    '快递单号': 'str',
+    '寄件人': 'category',
+    '寄达市名称': 'category',
+    '大宗客户名称': 'category',
+    '收寄时间': 'datetime64[us]'
+}
+TABLE_SCHEMAS = {
+    'sys-yishupingtai.xlsx': PLATFORM_ORDER_SCHEMA,
+    'sys-yishuchenjie.xlsx': ORDER_CENTER_SCHEMA,
+    'sys-aiyueyouyue.xlsx': ORDER_CENTER_SCHEMA,
+    'ems-ispay-3513.xlsx': EMS_BILL_SCHEMA,
+    'ems-nopay-3404.xlsx': EMS_BILL_SCHEMA
+}
+
+class SchemaDriftError(ValueError):
+    """表格结构与 TABLE_SCHEMAS 中的声明不一致"""
+
+def table_schema(path):
+    """获取文件适用的列类型声明（无声明返回None）"""
+    name = Path(path).name
+    return next((schema for pattern, schema in TABLE_SCHEMAS.items() if fnmatch.fnmatch(name, pattern)), None)
+
+def convert_column(series, kind):
+    """按声明转换一列 , 无法转换时抛出 ValueError"""
+    if kind == 'category':
+        return series.astype('category')
+    if kind == 'str':
+        if series.dtype != object and pd.api.types.is_string_dtype(series):
+            return series
+        # 数值与文本混合的列（如部分快递单号含字母）逐个转为文本 , 空值统一为NaN
+        # （保持object类型：pandas 2.x 的 astype('str') 会把NaN转为文本 'nan'）
+        return series.map(cell_text).where(series.notna(), np.nan).astype(object)
+    if kind == 'datetime64[us]':
+        return pd.to_datetime(series).astype('datetime64[us]')
+    if kind == 'Int64':
+        values = pd.to_numeric(series)
+        present = values.dropna()
+        if not pd.api.types.is_integer_dtype(values) and not (present == present.round()).all():
+            raise ValueError("存在小数")
+        return values.astype('Int64')
+    raise ValueError(f"未知类型：{kind}")
+
+def apply_schema(df, path, dtype=None, full=True):
+    """
+    按 TABLE_SCHEMAS 转换读取结果的列类型（dtype 中指定的列除外）
+    full 为 True（读取整表）时同时检查声明的列是否齐全
+    """
+    schema = table_schema(path)
+    if not schema:
+        return df
+    name = Path(path).name
+    if full:
+        missing = [col for col in schema if col not in df.columns]
+        if missing:
+            raise SchemaDriftError(f"{name} 缺少列：{missing}")
+    for col, kind in schema.items():
+        if col not in df.columns or col in (dtype or {}):
+            continue
+        try:
+            df[col] = convert_column(df[col], kind)
+        except (ValueError, TypeError) as e:
+            sample = df[col].dropna().astype(str).unique()[:3].tolist()
+            raise SchemaDriftError(f"{name} 列「{col}」不符合声明的类型 {kind}（{e}）, 样例：{sample}") from None
+    return df
+
+class ReadCache:
+    """
+    进程内的工作簿解析缓存 , 以 路径 + 修改时间 + 工作表 + dtype 为键
+    多个步骤读取同一文件时（如S3/S5读取sys-yishupingtai.xlsx , S6/S7读取sys-aiyueyouyue.xlsx）只解析一次 ,
+    各步骤从缓存的表格中按需取列（返回副本 , 调用方可放心修改）
+    指定读取列时只解析需要的列（usecols）, 后续步骤需要更多列时按并集重新读取
+    """
+    def __init__(self):
+        self.frames = {}  # 键 → (DataFrame, 已覆盖的列名集合 , None表示全部列)
+
+    @staticmethod
+    def key(path, sheet_name, dtype):
+        stat = os.stat(path)
+        dtype_spec = tuple(sorted((col, getattr(t, '__name__', str(t))) for col, t in (dtype or {}).items()))
+        return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size, sheet_name, dtype_spec)
+
+    def read(self, path, columns=None, dtype=None, sheet_name=0, **read_kwargs):
+        key = self.key(path, sheet_name, dtype)
+        rule = trailer_rule(path)
+        read_columns = columns
+        if columns is not None and rule:
+            # 汇总行判定依赖的列
+            read_columns = list(columns) + [rule[name] for name in ('label_column', 'key_column') if rule.get(name)]
+        cached = self.frames.get(key)
+        if cached is not None:
+            df, covered = cached
+            if covered is None or (columns is not None and covered.issuperset(read_columns)):
+                return project_columns(df, columns)
+            if columns is not None:
+                read_columns = list(covered) + list(read_columns)
+        # 自定义表头/跳过行时不做列裁剪
+        usecols, covered = None, None
+        if columns is not None and not {'header', 'skiprows', 'usecols'} & read_kwargs.keys():
+            usecols, covered = resolve_usecols(path, read_columns, sheet_name)
+        df = read_excel_cached(path, sheet_name=sheet_name, dtype=dtype, usecols=usecols, **read_kwargs)
+        if rule:
+            df = trim_trailer(df, rule)
+        df = apply_schema(df, path, dtype, full=usecols is None and not read_kwargs)
+        self.frames[key] = (df, covered)
+        return project_columns(df, columns)
+
+    def retain(self, names):
+        """只保留仍会被读取的文件（文件名集合）, 释放其余缓存"""
+        for key in [k for k in self.frames if Path(k[0]).name not in names]:
+            del self.frames[key]
+
+    def clear(self):
+        self.frames.clear()
+
+READ_CACHE = ReadCache()
+
+def resolve_usecols(path, columns, sheet_name=0):
+    """
+    读取表头行 , 把列名解析为列位置（供 read_excel 的 usecols 使用 , 未用到的列不做类型转换）
+    返回 (列位置列表, 已覆盖的列名集合)；表头有重名列等无法可靠解析时返回 (None, None) 读取全部列
+    表头中不存在的列计入已覆盖集合 , 由调用方给出缺列提示
+    """
+    from openpyxl import load_workbook
+    wb = load_workbook(path, read_only=True)
+    try:
+        ws = wb.worksheets[sheet_name] if isinstance(sheet_name, int) else wb[sheet_name]
+        header = next(ws.iter_rows(min_row=1, max_row=1, values_only=True), ())
+    finally:
+        wb.close()
+    names = [name for name in header if name is not None]
+    if len(names) != len(set(names)):
+        return None, None
+    positions = {name: i for i, name in enumerate(header) if name is not None}
+    usecols = sorted({positions[col] for col in columns if col in positions})
+    if not usecols:
+        return None, None
+    return usecols, set(columns)
+
+def project_columns(df, columns=None):
+    """按列投影并返回副本（不存在的列忽略 , 由调用方给出缺列提示）"""
+    if columns is None:
+        return df.copy()
+    return df[[col for col in dict.fromkeys(columns) if col in df.columns]].copy()
+
+def read_frame(path, dtype: dict = None, columns: list = None, **read_kwargs):
+    """
+    读取表格：优先使用本次运行中上游步骤发布的产物 , 否则从读取缓存中获取（首次读取时解析xlsx文件）
+    columns 指定时只返回需要的列
+    dtype中指定为str的列对内存产物同样转换为字符串（空值保持为空）
+    """
+    df = ARTIFACTS.lookup(path)
+    if df is None:
+        df = READ_CACHE.read(path, columns=columns, dtype=dtype, **read_kwargs)
+        count_rows(rows_read=len(df))
+        return record_frame(Path(path).name, df)
+    count_rows(rows_read=len(df))
+    df = project_columns(df, columns)
+    dtype = dtype or {}
+    for col in df.columns:
+        if dtype.get(col) is str:
+            df[col] = df[col].map(cell_text).astype(object)
+        elif col not in dtype and (df[col].dtype == object or pd.api.types.is_string_dtype(df[col].dtype)):
+            # 与重新解析xlsx一致：全部为数字文本的列转为数值
+            try:
+                df[col] = pd.to_numeric(df[col])
+            except (ValueError, TypeError):
+                pass
+    return record_frame(f"{Path(path).name}（内存产物）", df)
+
+def cell_text(value):
+    """按 read_excel(dtype=str) 的规则把单元格值转为文本（整数值的浮点数去掉小数部分 , 空值保持为空）"""
+    if pd.isna(value):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def write_frame(df, path):
+    """写出表格并发布为产物（延迟落盘的中间文件在本次运行结束时写出 , 见 ArtifactStore.write_deferred）"""
+    ARTIFACTS.publish(path, df)
+    count_rows(rows_written=len(df))
+    if ARTIFACTS.should_write(path):
+        write_excel(df, path)
+        return True
+    return False
+
+# ====================== 多文件并行处理 ======================
+class RecordCollector(logging.Handler):
+    """收集子进程中的日志 , 回传主进程后按文件顺序输出"""
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append((record.levelno, record.getMessage()))
+
+def _run_file_task(func, path, args, options, level, wanted, deferred):
+    """
+    进程池中处理单个文件
+    返回 (执行结果, 日志记录, 新发布的产物, 处理统计, 表格内存记录)
+    """
+    RUN_OPTIONS.update(options, jobs=1)
+    collector = RecordCollector()
+    log.handlers = [collector]
+    log.propagate = False
+    log.setLevel(level)
+    ARTIFACTS.reset(wanted, deferred)
+    STEP_STATS.clear()
+    FRAME_MEMORY.clear()
+    if mem_report_enabled():
+        reset_peak_rss()
+    try:
+        result = func(path, *args)
+    finally:
+        READ_CACHE.clear()
+    stats = dict(STEP_STATS)
+    if mem_report_enabled():
+        stats['peak_rss_mb'] = peak_rss_mb()
+    return result, collector.records, ARTIFACTS.published, stats, list(FRAME_MEMORY)
+
+def map_files(func, files, *args):
+    """
+    对多个文件逐一执行 func(文件, *args)
+    文件数大于1且 --jobs 大于1时在进程池中并行处理 , 各文件的日志、产物与处理统计
+    回传主进程后按文件顺序输出 , 结果与顺序执行一致
+    读取本次运行内存产物的文件在当前进程中处理
+    返回各文件的执行结果（顺序与 files 一致 , 子进程异常的文件为None）
+    """
+    files = list(files)
+    jobs = min(RUN_OPTIONS['jobs'], len(files))
+    if jobs <= 1 or any(ARTIFACTS.lookup(path) is not None for path in files):
+        return [func(path, *args) for path in files]
+
+    results = []
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(_run_file_task, func, path, args, dict(RUN_OPTIONS), log.level,
+                               ARTIFACTS.wanted, ARTIFACTS.deferred) for path in files]
+        for path, future in zip(files, futures):
+            try:
+                result, records, published, stats, frames = future.result()
+            except Exception as e:
+                log.error(f"处理失败：{Path(path).name} | 错误类型：{type(e).__name__} | 详情：{str(e)}")
+                results.append(None)
+                continue
+            for record_level, message in records:
+                log.log(record_level, message)
+            for name, df in published.items():
+                ARTIFACTS.publish(name, df)
+            # 子进程的峰值内存取各进程中的最大值（--mem-report）
+            child_rss = stats.pop('peak_rss_mb', None)
+            if child_rss is not None:
+                STEP_STATS['peak_rss_mb'] = max(STEP_STATS.get('peak_rss_mb', 0), child_rss)
+            count_rows(**stats)
+            FRAME_MEMORY.extend(frames)
+            results.append(result)
+    return results
 
 # ====================== 功能0：删除Excel最后一行有效数据 ======================
 def has_real_data(ws, row_num):
@@ -31,81 +522,256 @@ def has_real_data(ws, row_num):
             return True
     return False
 
+class UnsupportedWorkbook(Exception):
+    """快速路径无法处理的工作簿（如xls格式、含公式计算链）, 改为完整加载"""
+
+class SheetNotFoundError(KeyError):
+    """指定的工作表不存在（附带可用工作表列表）"""
+    def __init__(self, sheet_name, sheet_names):
+        super().__init__(f"工作表 '{sheet_name}' 不存在")
+        self.sheet_names = list(sheet_names)
+
+# 工作表XML解析（兼容带命名空间前缀的写法 , 如 <x:row>）
+XML_ROW = re.compile(r'<(?:\w+:)?row\b([^>]*?)(?:/>|>(.*?)</(?:\w+:)?row>)', re.S)
+XML_CELL = re.compile(r'<(?:\w+:)?c\b([^>]*?)(?:/>|>(.*?)</(?:\w+:)?c>)', re.S)
+XML_VALUE = re.compile(r'<(?:\w+:)?v>(.*?)</(?:\w+:)?v>', re.S)
+XML_TEXT = re.compile(r'<(?:\w+:)?t(?:\s[^>]*)?>(.*?)</(?:\w+:)?t>', re.S)
+XML_FORMULA = re.compile(r'<(?:\w+:)?f\b')
+XML_ROW_NUM = re.compile(r'\br="(\d+)"')
+XML_CELL_TYPE = re.compile(r'\bt="([^"]*)"')
+XML_ROW_REF = re.compile(r'(<(?:\w+:)?row\b[^>]*?\br=")(\d+)"')
+XML_CELL_REF = re.compile(r'(<(?:\w+:)?c\b[^>]*?\br="[A-Z]+)(\d+)"')
+XML_DIMENSION = re.compile(r'(<(?:\w+:)?dimension\b[^>]*?\bref="[A-Z]*\d*:?[A-Z]*)(\d+)"')
+BLANK_TEXTS = ("", " ")
+
+def xlsx_sheet_parts(zf):
+    """读取工作簿中的工作表列表 , 返回 [(工作表名, 工作表XML在压缩包中的路径)]"""
+    ns = {'m': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main',
+          'r': 'http://schemas.openxmlformats.org/officeDocument/2006/relationships',
+          'rel': 'http://schemas.openxmlformats.org/package/2006/relationships'}
+    workbook = ElementTree.fromstring(zf.read('xl/workbook.xml'))
+    rels = ElementTree.fromstring(zf.read('xl/_rels/workbook.xml.rels'))
+    targets = {rel.get('Id'): rel.get('Target') for rel in rels.findall('rel:Relationship', ns)}
+    parts = []
+    for sheet in workbook.findall('m:sheets/m:sheet', ns):
+        target = targets.get(sheet.get(f"{{{ns['r']}}}id"), '')
+        target = target.lstrip('/') if target.startswith('/') else f"xl/{target}"
+        parts.append((sheet.get('name'), target))
+    return parts
+
+def blank_shared_strings(zf):
+    """共享字符串表中内容为空或单个空格的条目序号"""
+    try:
+        xml = zf.read('xl/sharedStrings.xml').decode('utf-8')
+    except KeyError:
+        return set()
+    items = re.findall(r'<(?:\w+:)?si\b[^>]*?(?:/>|>(.*?)</(?:\w+:)?si>)', xml, re.S)
+    return {i for i, item in enumerate(items) if html.unescape(''.join(XML_TEXT.findall(item))) in BLANK_TEXTS}
+
+def xml_row_has_data(row_xml, blank_strings):
+    """检测工作表XML中的一行是否包含真实数据（与 has_real_data 规则一致 , 公式单元格视为有数据）"""
+    for attrs, inner in XML_CELL.findall(row_xml or ''):
+        if not inner:
+            continue
+        if XML_FORMULA.search(inner):
+            return True
+        cell_type = XML_CELL_TYPE.search(attrs)
+        cell_type = cell_type.group(1) if cell_type else 'n'
+        if cell_type == 'inlineStr':
+            if html.unescape(''.join(XML_TEXT.findall(inner))) not in BLANK_TEXTS:
+                return True
+            continue
+        value = XML_VALUE.search(inner)
+        if value is None or value.group(1) == '':
+            continue
+        if cell_type == 's':
+            if int(value.group(1)) not in blank_strings():
+                return True
+        elif cell_type == 'str':
+            if html.unescape(value.group(1)) not in BLANK_TEXTS:
+                return True
+        else:
+            return True  # 数值、布尔、错误值、日期
+    return False
+
+def delete_last_row_in_xml(path, sheet_name: str = None) -> dict:
+    """
+    快速删除最后一行有效数据：不加载整个工作簿 , 只改写压缩包中目标工作表的XML
+    从表尾逆序逐行检测 , 通常只需检查末尾几行；删除该行后将其下方的行上移一行（与 delete_rows 一致）
+    样式、共享字符串及其他工作表原样保留
+    :return: {'sheet', 'sheet_names', 'original_max_row', 'last_data_row', 'new_max_row'} , 工作表无有效数据时 last_data_row 为None
+    """
+    try:
+        zf = zipfile.ZipFile(path)
+    except zipfile.BadZipFile:
+        raise UnsupportedWorkbook("非xlsx格式")
+    with zf:
+        names = set(zf.namelist())
+        if 'xl/workbook.xml' not in names:
+            raise UnsupportedWorkbook("非xlsx格式")
+        if 'xl/calcChain.xml' in names:
+            raise UnsupportedWorkbook("工作簿包含公式计算链")
+        sheet_parts = xlsx_sheet_parts(zf)
+        sheet_names = [name for name, _ in sheet_parts]
+        if sheet_name:
+            if sheet_name not in sheet_names:
+                raise SheetNotFoundError(sheet_name, sheet_names)
+            part = dict(sheet_parts)[sheet_name]
+        else:
+            sheet_name, part = sheet_parts[0]
+        xml = zf.read(part).decode('utf-8')
+
+        blank_cache = []
+        def blank_strings():
+            if not blank_cache:
+                blank_cache.append(blank_shared_strings(zf))
+            return blank_cache[0]
+
+        # 逆序扫描工作表数据区的行
+        data_start = re.search(r'<((?:\w+:)?)sheetData\b', xml)
+        data_end = xml.rfind('sheetData>')
+        if data_start is None or data_end < 0:
+            raise UnsupportedWorkbook("工作表结构无法识别")
+        row_tag = f"<{data_start.group(1)}row"
+        original_max_row, last_row = 0, None
+        pos = data_end
+        while True:
+            pos = xml.rfind(row_tag, data_start.end(), pos)
+            if pos < 0:
+                break
+            if xml[pos + len(row_tag)] not in ' \t\r\n/>':
+                continue
+            row = XML_ROW.match(xml, pos)
+            row_num = XML_ROW_NUM.search(row.group(1)) if row else None
+            if row_num is None:
+                raise UnsupportedWorkbook("行缺少行号")
+            if not original_max_row and row.group(2) and XML_CELL.search(row.group(2)):
+                original_max_row = int(row_num.group(1))
+            if xml_row_has_data(row.group(2), blank_strings):
+                last_row = row
+                break
+
+        result = {'sheet': sheet_name, 'sheet_names': sheet_names, 'original_max_row': original_max_row,
+                  'last_data_row': None, 'new_max_row': original_max_row}
+        if last_row is None:
+            return result
+        last_data_row = int(XML_ROW_NUM.search(last_row.group(1)).group(1))
+
+        # 删除该行 , 下方的行（仅含格式）上移一行
+        shift = lambda m: f'{m.group(1)}{int(m.group(2)) - 1}"'
+        tail = XML_CELL_REF.sub(shift, XML_ROW_REF.sub(shift, xml[last_row.end():]))
+        head = XML_DIMENSION.sub(lambda m: shift(m) if int(m.group(2)) >= max(last_data_row, 2) else m.group(0),
+                                 xml[:last_row.start()], count=1)
+        new_xml = (head + tail).encode('utf-8')
+
+        # 其余部件原样复制 , 写入临时文件后替换原文件
+        tmp_path = f"{path}.tmp"
+        try:
+            with zipfile.ZipFile(tmp_path, 'w') as out:
+                for info in zf.infolist():
+                    out.writestr(info, new_xml if info.filename == part else zf.read(info))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    os.replace(tmp_path, path)
+    result.update(last_data_row=last_data_row, new_max_row=original_max_row - 1)
+    return result
+
 def delete_last_row_enhanced(excel_paths: list, sheet_name: str = None):
     """
     删除Excel文件最后一行有效数据（增强版）
+    xlsx文件直接改写工作表XML（见 delete_last_row_in_xml）, 其他情况完整加载工作簿处理
+    多个文件按 --jobs 并行处理
     参数说明：
         :param excel_paths: Excel文件路径列表（支持多个文件）
         :param sheet_name: 指定统一的工作表名称（可选）
     """
-    for path in excel_paths:
-        print("\n" + "="*40)
-        print(f"🟢 开始处理 Excel 文件: {path}")
-        # print(f"🔧 工作表: '{sheet_name}'" if sheet_name else "🔧 工作表: 使用第一个工作表（默认）") 
+    map_files(delete_last_row_single, excel_paths, sheet_name)
 
-        try:
-            # ========== 加载阶段 ==========
-            load_start = time.time()
-            print("\n[1/3] ⏳ 正在加载工作簿...", end=" ", flush=True)
-            wb = load_workbook(path)
-            sheet_names = wb.sheetnames
-            
-            # 获取目标工作表
-            if sheet_name:
-                if sheet_name not in sheet_names:
-                    raise KeyError(f"工作表 '{sheet_name}' 不存在")
-                ws = wb[sheet_name]
-            else:
-                ws = wb.worksheets[0]
-                sheet_name = ws.title
-            
-            print(f"✅ 完成（耗时 {time.time()-load_start:.1f}s）")
-            print(f"   ▸ 工作表列表: {', '.join(sheet_names)}")
-            print(f"   ▸ 当前操作表: '{sheet_name}'")
+def delete_last_row_single(path, sheet_name: str = None):
+    """删除单个Excel文件最后一行有效数据（delete_last_row_enhanced 的单文件处理）"""
+    log.info("\n" + "="*40)
+    log.info(f"🟢 开始处理 Excel 文件: {path}")
+    # print(f"🔧 工作表: '{sheet_name}'" if sheet_name else "🔧 工作表: 使用第一个工作表（默认）") 
 
-            # ========== 数据检测阶段 ==========
-            print("\n[2/3] 🔍 正在深度检测数据...")
-            original_max_row = ws.max_row
-            
-            # 空表检测（兼容格式残留情况）
-            if original_max_row == 0 or not any(has_real_data(ws, row) for row in range(1, original_max_row+1)):
-                print("⏹️ 终止：工作表无有效数据")
+    try:
+        load_start = time.time()
+        # ========== 快速路径 ==========
+        try:
+            result = delete_last_row_in_xml(path, sheet_name)
+        except UnsupportedWorkbook as e:
+            log.info(f"   ▸ {e} , 改为完整加载工作簿")
+            result = None
+        if result is not None:
+            log.info(f"   ▸ 工作表列表: {', '.join(result['sheet_names'])}")
+            log.info(f"   ▸ 当前操作表: '{result['sheet']}'")
+            if result['last_data_row'] is None:
+                log.warning("⏹️ 终止：工作表无有效数据")
                 return
-            # 定位最后有效行
-            last_data_row = next(
-                row for row in reversed(range(1, original_max_row+1))
-                if has_real_data(ws, row)
-            )
-            print(f"   ▸ 最后有效数据行: 第 {last_data_row} 行")
-
-            # ========== 删除操作阶段 ==========
-            print(f"\n🗑️ 正在删除第 {last_data_row} 行...", end=" ", flush=True)
-            ws.delete_rows(last_data_row)
-            print("✅ 完成")
-            # ========== 保存阶段 ==========
-            print("\n[3/3] 💾 正在保存文件...", end=" ", flush=True)
-            save_start = time.time()
-            wb.save(path)
-            print(f"✅ 完成（耗时 {time.time()-save_start:.1f}s）")
-            # ========== 最终报告 ==========
-            print("\n" + "="*40)
-            print(f"🎉 操作成功！总耗时: {time.time()-load_start:.1f}秒")
-            print(f"➜ 原行数: {original_max_row} → 新行数: {ws.max_row}")
-
-        except StopIteration:
-            print("\n⚠️ 异常：检测到空行但无法定位有效数据")
-        except KeyError as e:
-            print(f"\n❌ 错误：{str(e)}")
-            print("可用工作表列表：")
-            for idx, name in enumerate(sheet_names, 1):
-                print(f"  {idx}. {name}")
-        except FileNotFoundError:
-            print("\n❌ 错误：文件不存在，请检查路径是否正确")
-        except PermissionError:
-            print("\n❌ 错误：文件被占用，请关闭Excel后重试")
-        except Exception as e:
-            print(f"\n❌ 文件 {path} 发生未知错误：{str(e)}")
-            continue
+            log.info(f"   ▸ 最后有效数据行: 第 {result['last_data_row']} 行")
+            log.info(f"\n🗑️ 已删除第 {result['last_data_row']} 行（仅改写工作表数据 , 样式与其他工作表保持不变）")
+            log.info("\n" + "="*40)
+            log.info(f"🎉 操作成功！总耗时: {time.time()-load_start:.1f}秒")
+            log.info(f"➜ 原行数: {result['original_max_row']} → 新行数: {result['new_max_row']}")
+            return
+
+        # ========== 加载阶段 ==========
+        log.info("\n[1/3] ⏳ 正在加载工作簿...")
+        from openpyxl import load_workbook
+        wb = load_workbook(path)
+        sheet_names = wb.sheetnames
+        
+        # 获取目标工作表
+        if sheet_name:
+            if sheet_name not in sheet_names:
+                raise SheetNotFoundError(sheet_name, sheet_names)
+            ws = wb[sheet_name]
+        else:
+            ws = wb.worksheets[0]
+        
+        log.info(f"   ✅ 完成（耗时 {time.time()-load_start:.1f}s）")
+        log.info(f"   ▸ 工作表列表: {', '.join(sheet_names)}")
+        log.info(f"   ▸ 当前操作表: '{ws.title}'")
+
+        # ========== 数据检测阶段 ==========
+        log.info("\n[2/3] 🔍 正在深度检测数据...")
+        original_max_row = ws.max_row
+        
+        # 从表尾逆序定位最后有效行（兼容格式残留情况 , 找不到即为空表）
+        last_data_row = next(
+            (row for row in reversed(range(1, original_max_row+1)) if has_real_data(ws, row)),
+            None
+        )
+        if last_data_row is None:
+            log.warning("⏹️ 终止：工作表无有效数据")
+            return
+        log.info(f"   ▸ 最后有效数据行: 第 {last_data_row} 行")
+
+        # ========== 删除操作阶段 ==========
+        ws.delete_rows(last_data_row)
+        log.info(f"\n🗑️ 已删除第 {last_data_row} 行")
+        # ========== 保存阶段 ==========
+        log.info("\n[3/3] 💾 正在保存文件...")
+        save_start = time.time()
+        wb.save(path)
+        log.info(f"   ✅ 完成（耗时 {time.time()-save_start:.1f}s）")
+        # ========== 最终报告 ==========
+        log.info("\n" + "="*40)
+        log.info(f"🎉 操作成功！总耗时: {time.time()-load_start:.1f}秒")
+        log.info(f"➜ 原行数: {original_max_row} → 新行数: {ws.max_row}")
+
+    except KeyError as e:
+        log.error(f"\n❌ 错误：{str(e)}")
+        log.error("可用工作表列表：")
+        for idx, name in enumerate(getattr(e, 'sheet_names', []), 1):
+            log.error(f"  {idx}. {name}")
+    except FileNotFoundError:
+        log.error("\n❌ 错误：文件不存在，请检查路径是否正确")
+    except PermissionError:
+        log.error("\n❌ 错误：文件被占用，请关闭Excel后重试")
+    except Exception as e:
+        log.error(f"\n❌ 文件 {path} 发生未知错误：{str(e)}")
 
 # ====================== 功能1：数据清洗与增强 ======================
 def clean_data(input_path, output_path=None, delete_original=False):
@@ -119,12 +785,12 @@ def clean_data(input_path, output_path=None, delete_original=False):
     input_path = Path(input_path)
     output_path = Path(output_path) if output_path else input_path.with_name(f"result_cleaned_{input_path.name}")
     try:
-        df = pd.read_excel(input_path)
+        df = record_frame(input_path.name, read_excel_cached(input_path))
         df.columns = [col.strip() for col in df.columns]
         # 如果区域标识列已存在 → 先删除
         if '区域标识' in df.columns:
             df.drop(columns=['区域标识'], inplace=True)
-            print("检测到已有区域标识列，已执行覆盖更新")
+            log.info("检测到已有区域标识列，已执行覆盖更新")
         # 插入区域标识列（无论之前是否存在）
         if '区域类型' in df.columns:
             insert_pos = df.columns.get_loc('区域类型') + 1
@@ -136,15 +802,15 @@ def clean_data(input_path, output_path=None, delete_original=False):
             )
         else:
             raise ValueError("必要列「区域类型」缺失")
-        df.to_excel(output_path, index=False)
-        print(f"清洗完成 → {output_path}")
+        write_excel(df, output_path)
+        log.info(f"清洗完成 → {output_path}")
         # 删除原文件（危险操作！）
         if delete_original and input_path.exists():
             os.remove(str(input_path))  # 直接删除，不可恢复！
-            print(f"原文件已永久删除：{input_path.name}")
+            log.info(f"原文件已永久删除：{input_path.name}")
 
     except Exception as e:
-        print(f"处理失败：{input_path.name} | 错误类型：{type(e).__name__} | 详情：{str(e)}")
+        log.error(f"处理失败：{input_path.name} | 错误类型：{type(e).__name__} | 详情：{str(e)}")
         if output_path and Path(output_path).exists():
             os.remove(output_path)  # 清理无效结果文件
 
@@ -163,7 +829,7 @@ def batch_rename(file_mapping, target_dir="."):
         old_path = Path(target_dir) / old_name
         new_path = Path(target_dir) / new_name
         if not old_path.exists():
-            print(f"⚠️ 文件不存在: {old_name} - 已跳过")
+            log.warning(f"⚠️ 文件不存在: {old_name} - 已跳过")
             continue
         # 处理文件名冲突（自动添加序号）
         counter = 1
@@ -175,9 +841,9 @@ def batch_rename(file_mapping, target_dir="."):
             counter += 1
         try:
             shutil.move(str(old_path), str(temp_new_path))
-            print(f"✅ 重命名成功: {old_name} → {temp_new_path.name}")
+            log.info(f"✅ 重命名成功: {old_name} → {temp_new_path.name}")
         except Exception as e:
-            print(f"❌ 重命名失败: {old_name} → {new_name} | 错误信息: {str(e)}")
+            log.error(f"❌ 重命名失败: {old_name} → {new_name} | 错误信息: {str(e)}")
 
 def renameExcel():
     """文件批量重命名"""
@@ -191,12 +857,121 @@ def renameExcel():
     batch_rename(rename_mapping)
 
 # ====================== 功能3：Excel数据筛选 （支持动态多文件处理）======================
+class FilterPlan:
+    """
+    筛选条件的编译执行计划（条件格式见 excel_like_filter）
+    - 条件只解析一次 , 运算符在编译时校验
+    - in / not in / 多值 != 的取值去重后按哈希集合匹配
+    - 执行时先在抽样行上估算各条件的选择率 , 选择性最强的条件先执行 ,
+      后续条件只在前面条件保留下来的行上计算
+    - explain() 查看最近一次执行时每个条件的输入/输出行数与选择率
+    """
+    OPERATORS = ['>','<','>=','<=','!=','in','not in']
+    SAMPLE_ROWS = 1000
+
+    def __init__(self, filter_dict: dict, enhanced: bool = False):
+        self.predicates = []  # (列名, 运算, 取值, 条件描述)
+        self.stats = []
+        for col, condition in (filter_dict or {}).items():
+            # 处理元组条件（运算符+值）
+            if isinstance(condition, tuple):
+                operator, value = condition
+                # 增强模式：严格校验运算符
+                if enhanced and operator not in self.OPERATORS:
+                    raise ValueError(f"无效运算符：{operator}（增强模式要求使用明确运算符）")
+                # 处理多值排除（增强模式特性）
+                if operator == '!=' and isinstance(value, list):
+                    self.predicates.append((col, 'not in', self.value_set(value), f"{col} not in {value}"))
+                elif operator in ['in', 'not in']:
+                    self.predicates.append((col, operator, self.value_set(value), f"{col} {operator} {value}"))
+                elif operator in self.OPERATORS:
+                    self.predicates.append((col, operator, value, f"{col} {operator} {value!r}"))
+                else:
+                    # 基础模式兼容旧写法
+                    self.predicates.append((col, '==', condition, f"{col} == {condition!r}"))
+            # 处理列表条件（自动转换为IN操作）
+            elif isinstance(condition, list):
+                self.predicates.append((col, 'in', self.value_set(condition), f"{col} in {condition}"))
+            # 处理单值条件
+            else:
+                self.predicates.append((col, '==', condition, f"{col} == {condition!r}"))
+
+    @staticmethod
+    def value_set(value):
+        """多值条件去重（非列表或不可哈希的取值保持原样 , 交由pandas处理）"""
+        if not isinstance(value, (list, tuple, set, frozenset)):
+            return value
+        try:
+            return list(dict.fromkeys(value))
+        except TypeError:
+            return value
+
+    @staticmethod
+    def evaluate(series, operator, value):
+        """计算单个条件 , 返回布尔数组（空值只满足 != 条件）"""
+        if operator in ('>', '<', '>=', '<=') and isinstance(series.dtype, pd.CategoricalDtype):
+            series = series.astype(series.cat.categories.dtype)  # 无序分类不支持大小比较 , 按原取值比较
+        if operator == 'in':
+            result = series.isin(value)
+        elif operator == 'not in':
+            result = ~series.isin(value)
+        elif operator == '>':
+            result = series > value
+        elif operator == '<':
+            result = series < value
+        elif operator == '>=':
+            result = series >= value
+        elif operator == '<=':
+            result = series <= value
+        elif operator == '!=':
+            result = series != value
+        else:
+            result = series == value
+        return result.to_numpy(dtype=bool, na_value=operator == '!=')
+
+    def order(self, df):
+        """按抽样选择率排序（保留比例越低越先执行 , 同等情况下保持原顺序）"""
+        if len(df) <= self.SAMPLE_ROWS:
+            sample = df
+        else:
+            sample = df.iloc[::len(df) // self.SAMPLE_ROWS]
+        ranked = []
+        for i, (col, operator, value, label) in enumerate(self.predicates):
+            selectivity = self.evaluate(sample[col], operator, value).mean() if len(sample) else 0.0
+            ranked.append((selectivity, i))
+        return [self.predicates[i] for _, i in sorted(ranked)]
+
+    def apply(self, df):
+        """执行筛选 , 返回保留的行（保持原有行顺序与索引）"""
+        for col, _, _, _ in self.predicates:
+            if col not in df.columns:
+                raise ValueError(f"列 '{col}' 不存在")
+        self.stats = []
+        if not self.predicates:
+            return df
+        rows = np.arange(len(df))
+        for col, operator, value, label in self.order(df):
+            rows_in = len(rows)
+            if rows_in:
+                rows = rows[self.evaluate(df[col].iloc[rows], operator, value)]
+            self.stats.append((label, rows_in, len(rows)))
+        return df.iloc[rows]
+
+    def explain(self):
+        """最近一次执行的条件顺序与选择率"""
+        lines = [f"{'顺序':<4} {'输入行数':>10} {'输出行数':>10} {'选择率':>8}  条件"]
+        for i, (label, rows_in, rows_out) in enumerate(self.stats, 1):
+            ratio = rows_out / rows_in if rows_in else 0.0
+            lines.append(f"{i:<6} {rows_in:>12} {rows_out:>12} {ratio:>10.1%}  {label}")
+        return "\n".join(lines)
+
 def excel_like_filter(
     input_path: Union[str, list],  # 支持字符串或列表输入
     filter_dict: dict = None,
     keep_columns: list = None,
     enhanced: bool = False,
-    output_prefix: str = "_result"  # 输出文件名后缀
+    output_prefix: str = "_result",  # 输出文件名后缀
+    specs: list = None
 ):
     """    
     参数：
@@ -210,6 +985,8 @@ def excel_like_filter(
     :param filter_dict: 筛选条件字典（格式见示例）
     :param keep_columns: 保留列列表
     :param enhanced: 是否启用增强模式（支持 != 多值排除等特性）
+    :param specs: 多输出模式 , [(filter_dict, keep_columns, output_prefix), ...]
+                  同一输入文件只读取一次 , 依次按每组条件筛选并分别输出（指定后忽略前三个同名参数）
 
     基础模式条件示例：
     {'年龄': ('>', 30), '城市': ['北京','上海']}
@@ -218,6 +995,10 @@ def excel_like_filter(
     - 支持 != 运算符排除多个值
     - 支持 not in 运算符
     - 更严格的类型检查
+
+    多输出示例：
+    excel_like_filter("sys-yishupingtai.xlsx", specs=[PAY_POSTAGE_SPEC, FREE_POSTAGE_SPEC])
+    → 生成 sys-yishupingtai_sys-ispay-1.xlsx 和 sys-yishupingtai_sys-nopay.xlsx
     """
  
  # 统一转换为文件路径列表
@@ -225,87 +1006,282 @@ def excel_like_filter(
         input_files = [Path(input_path)]
     else:
         input_files = [Path(p) for p in input_path]
+    if specs is None:
+        specs = [(filter_dict, keep_columns, output_prefix)]
+
+    # 所有输出都指定保留列时 , 只读取筛选列与保留列
+    columns = None
+    if all(spec_keep for _, spec_keep, _ in specs):
+        columns = [col for spec_filter, spec_keep, _ in specs for col in list(spec_filter or {}) + list(spec_keep)]
+
+    # 处理每个文件（多个文件时按 --jobs 并行处理）
+    map_files(filter_file, input_files, specs, columns, enhanced)
+
+def filter_file(in_file: Path, specs: list, columns: list = None, enhanced: bool = False):
+    """筛选单个文件并按每组条件分别输出（excel_like_filter 的单文件处理）"""
+    # 分块筛选（上游产物已在内存中、读取时需去除表尾汇总行的文件仍整表处理）
+    if RUN_OPTIONS['stream_rows'] > 0 and ARTIFACTS.lookup(in_file) is None and trailer_rule(in_file) is None:
+        stream_filter_file(in_file, specs, columns, enhanced)
+        return
+    try:
+        # 读取Excel数据
+        source = read_frame(in_file, columns=columns)
+    except Exception as e:
+        log.error(f"处理失败：{in_file.name} | 错误：{str(e)}")
+        return
 
-    # 处理每个文件
-    for in_file in input_files:
+    for spec_filter, spec_keep, spec_prefix in specs:
         # 生成输出路径
-        out_file = in_file.with_name(f"{in_file.stem}{output_prefix}.xlsx")
-        
+        out_file = in_file.with_name(f"{in_file.stem}{spec_prefix}.xlsx")
         try:
-            # 读取Excel数据
-            df = pd.read_excel(in_file)
-            if filter_dict:
-                mask = pd.Series(True, index=df.index)
-                for col, condition in filter_dict.items():
-                    # 执行数据筛选
-                    if filter_dict:
-                        mask = pd.Series(True, index=df.index)
-                        for col, condition in filter_dict.items():
-                            if col not in df.columns:
-                                raise ValueError(f"列 '{col}' 不存在")
-                                
-                            # 处理元组条件（运算符+值）
-                            if isinstance(condition, tuple):
-                                operator, value = condition
-                                # 增强模式：严格校验运算符
-                                if enhanced and operator not in ['>','<','>=','<=','!=','in','not in']:
-                                    raise ValueError(f"无效运算符：{operator}（增强模式要求使用明确运算符）")
-                                # 处理多值排除（增强模式特性）
-                                if operator == '!=' and isinstance(value, list):
-                                    mask &= ~df[col].isin(value)
-                                elif operator == '>':
-                                    mask &= (df[col] > value)
-                                elif operator == '<':
-                                    mask &= (df[col] < value)
-                                elif operator == '>=':
-                                    mask &= (df[col] >= value)
-                                elif operator == '<=':
-                                    mask &= (df[col] <= value)
-                                elif operator == '!=':
-                                    mask &= (df[col] != value)
-                                elif operator == 'in':
-                                    mask &= df[col].isin(value)
-                                elif operator == 'not in':
-                                    mask &= ~df[col].isin(value)
-                                else:
-                                    if enhanced:
-                                        raise ValueError(f"增强模式不支持运算符：{operator}")
-                                    # 基础模式兼容旧写法
-                                    mask &= (df[col] == condition)
-                            # 处理列表条件（自动转换为IN操作）
-                            elif isinstance(condition, list):
-                                mask &= df[col].isin(condition)
-                            # 处理单值条件
-                            else:
-                                mask &= (df[col] == condition)
-                        df = df[mask]
-
-            if keep_columns:
+            # 执行数据筛选
+            plan = FilterPlan(spec_filter, enhanced)
+            df = plan.apply(source)
+            if RUN_OPTIONS['explain_filters'] and plan.stats:
+                log.info(f"🔎 筛选计划（{in_file.name} → {out_file.name}）：\n{plan.explain()}")
+
+            if spec_keep:
                 # 处理列选择
-                if keep_columns:
-                    missing_cols = [col for col in keep_columns if col not in df.columns]
-                    if missing_cols:
-                        raise ValueError(f"缺失列：{missing_cols}")
-                    df = df[keep_columns]
+                missing_cols = [col for col in spec_keep if col not in df.columns]
+                if missing_cols:
+                    raise ValueError(f"缺失列：{missing_cols}")
+                df = df[spec_keep]
 
             # 保存结果
-            df.to_excel(out_file, index=False)
-            print(f"处理成功：{in_file.name} → {out_file.name}")
-            
+            if write_frame(df, out_file):
+                log.info(f"处理成功：{in_file.name} → {out_file.name}")
+            else:
+                log.info(f"处理成功：{in_file.name} → {out_file.name}（本次运行结束时写出）")
+
         except Exception as e:
-            print(f"处理失败：{in_file.name} | 错误：{str(e)}")
+            if len(specs) > 1:
+                log.error(f"处理失败：{in_file.name} → {out_file.name} | 错误：{str(e)}")
+            else:
+                log.error(f"处理失败：{in_file.name} | 错误：{str(e)}")
+
+# ====================== 分块筛选（--stream-rows） ======================
+"""
+分块筛选不把整张表放入内存：
+    1. 逐行读取工作表 , 需要的列按块暂存到临时文件 , 同时记录每列出现过的各类取值（每类一个样例）
+    2. 由样例推断整列的类型（与整表读取的推断结果相同 , 如某行为空时整数列为小数列）, 按块转换类型后筛选 ,
+       每组条件保留的行暂存到各自的临时文件
+    3. 按块写出 , 结果与整表读取筛选的输出逐字节相同
+"""
+NUMERIC_TEXT = re.compile(r'[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?')
+INF_TEXT = {'inf', '+inf', '-inf', 'infinity', '+infinity', '-infinity'}
+
+def integer_range(value: int) -> int:
+    """整数的取值范围（负int64 / 非负int64 / uint64 / 超出64位）, 不同范围推断出的列类型不同"""
+    if -2**63 <= value < 0:
+        return 0
+    if 0 <= value < 2**63:
+        return 1
+    return 2 if 0 <= value < 2**64 else 3
+
+def value_kind(value):
+    """单元格取值的类别 , 同一类别的取值对列类型推断的影响相同"""
+    kind = type(value)
+    if kind is str:
+        from pandas._libs.parsers import STR_NA_VALUES
+        if value in STR_NA_VALUES:
+            return 'na'
+        text = value.strip()
+        if text.lower() in ('true', 'false'):
+            return ('bool-text', text.lower())
+        if text.lower() in INF_TEXT:
+            return 'inf-text'
+        if NUMERIC_TEXT.fullmatch(text):
+            if any(c in text for c in '.eE'):
+                return ('number-text', 'float', text != value)
+            return ('number-text', integer_range(int(text)), text != value)
+        return 'text'
+    if kind is float:
+        return 'na' if value != value else 'float'
+    if kind is int:
+        return ('int', integer_range(value))
+    if hasattr(value, 'tzinfo'):
+        return (kind, value.tzinfo is not None)
+    return kind
+
+def column_dtypes(names: list, samples: list) -> dict:
+    """按各列的取值样例推断整列类型（与整表读取使用同一解析器）, 没有数据行的列为None"""
+    from pandas.io.parsers import TextParser
+    dtypes = {}
+    for name, column in zip(names, samples):
+        if not column:
+            dtypes[name] = None
+            continue
+        # 附加一列占位 , 避免单列时空行被跳过
+        frame = TextParser([[value, 0] for value in column.values()], names=[0, 1], header=None).read()
+        dtypes[name] = frame[0].dtype
+    return dtypes
+
+def typed_chunk(rows: list, names: list, dtypes: dict, start: int):
+    """按整列类型解析一块数据 , 行索引从该块在表中的位置开始编号（与整表读取的行索引一致）"""
+    from pandas.io.parsers import TextParser
+    # 文本列按原值读取（不把块内恰好都是数字的文本转换为数值）
+    keep_raw = {name: object for name, dtype in dtypes.items()
+                if dtype is not None and (dtype == object or isinstance(dtype, pd.StringDtype))}
+    frame = TextParser(rows, names=names, header=None, dtype=keep_raw).read()
+    for name, dtype in dtypes.items():
+        if dtype is None or frame[name].dtype == dtype:
+            continue
+        if dtype.kind == 'M':
+            frame[name] = pd.to_datetime(frame[name]).astype(dtype)
+        else:
+            frame[name] = frame[name].astype(dtype)
+    frame.index = pd.RangeIndex(start, start + len(frame))
+    return frame
+
+def spooled_chunks(spool):
+    """逐块读回临时文件中的数据"""
+    import pickle
+    spool.seek(0)
+    while True:
+        try:
+            yield pickle.load(spool)
+        except EOFError:
+            return
+
+def stream_filter_file(in_file: Path, specs: list, columns: list = None, enhanced: bool = False):
+    """分块筛选单个文件（filter_file 的 --stream-rows 实现 , 日志与输出均与整表处理相同）"""
+    import pickle
+    import tempfile
+    chunk_rows = RUN_OPTIONS['stream_rows']
+    spools = []
+    try:
+        # 第1遍：读取需要的列并暂存 , 记录各列取值样例
+        rows = iter_sheet_rows(in_file)
+        header = next(rows, None)
+        if header is None:
+            raise ValueError("工作表为空")
+        from pandas.io.parsers import TextParser
+        names = list(TextParser([header], header=0).read().columns)  # 重名列、空列名与整表读取一样处理
+        width = len(names)
+        picked = [i for i, name in enumerate(names) if columns is None or name in columns]
+        if width > 1 and len(picked) < 2:
+            # 多列表格只用到一列时多读一列 , 中间的空行与整表读取一样保留为空值行
+            picked = sorted(picked + [next(i for i in range(width) if i not in picked)])
+        picked_names = [names[i] for i in picked]
+        samples = [{} for _ in picked]
+        source = tempfile.TemporaryFile()
+        spools.append(source)
+        total, block = 0, []
+
+        def flush():
+            for values, column in zip(samples, zip(*block)):
+                for value in column:
+                    kind = value_kind(value)
+                    if kind not in values:
+                        values[kind] = value
+            pickle.dump(block, source, pickle.HIGHEST_PROTOCOL)
+
+        for number, row in enumerate(rows, 2):
+            if len(row) > width:
+                raise ValueError(f"第{number}行的数据超出表头的列数 , 请去掉 --stream-rows 整表处理")
+            row += [""] * (width - len(row))
+            block.append([row[i] for i in picked])
+            total += 1
+            if len(block) >= chunk_rows:
+                flush()
+                block = []
+        if block or not total:
+            flush()  # 没有数据行时同样执行一次筛选 , 条件中的缺列照常提示
+        count_rows(rows_read=total)
+        dtypes = column_dtypes(picked_names, samples)
+
+        # 第2遍：按整列类型解析并筛选 , 每组条件保留的行分别暂存
+        plans = [FilterPlan(spec_filter, enhanced) for spec_filter, _, _ in specs]
+        stats = [{} for _ in specs]
+        results = [[0, tempfile.TemporaryFile(), None] for _ in specs]  # 保留行数 , 暂存文件 , 错误
+        spools.extend(spool for _, spool, _ in results)
+        start = 0
+        for block in spooled_chunks(source):
+            frame = typed_chunk(block, picked_names, dtypes, start)
+            frame = apply_schema(frame, in_file, full=columns is None)
+            start += len(block)
+            for (spec_filter, spec_keep, _), plan, plan_stats, result in zip(specs, plans, stats, results):
+                if result[2] is not None:
+                    continue
+                try:
+                    df = plan.apply(frame)
+                    for label, rows_in, rows_out in plan.stats:
+                        counts = plan_stats.setdefault(label, [0, 0])
+                        counts[0] += rows_in
+                        counts[1] += rows_out
+                    if spec_keep:
+                        missing_cols = [col for col in spec_keep if col not in df.columns]
+                        if missing_cols:
+                            raise ValueError(f"缺失列：{missing_cols}")
+                        df = df[spec_keep]
+                    result[0] += len(df)
+                    pickle.dump(df, result[1], pickle.HIGHEST_PROTOCOL)
+                except Exception as e:
+                    result[2] = e
+        source.close()
+    except Exception as e:
+        for spool in spools:
+            spool.close()
+        log.error(f"处理失败：{in_file.name} | 错误：{str(e)}")
+        return
+
+    # 第3遍：逐组写出
+    for (spec_filter, spec_keep, spec_prefix), plan, plan_stats, (kept, spool, error) in zip(specs, plans, stats, results):
+        out_file = in_file.with_name(f"{in_file.stem}{spec_prefix}.xlsx")
+        try:
+            if error is not None:
+                raise error
+            plan.stats = [(label, rows_in, rows_out) for label, (rows_in, rows_out) in plan_stats.items()]
+            if RUN_OPTIONS['explain_filters'] and plan.stats:
+                log.info(f"🔎 筛选计划（{in_file.name} → {out_file.name}）：\n{plan.explain()}")
+            keep_names = list(spec_keep) if spec_keep else picked_names
+            if out_file.name in ARTIFACTS.wanted:
+                # 下游步骤需要的产物整表发布到内存
+                frames = list(spooled_chunks(spool))
+                written = write_frame(pd.concat(frames) if frames else pd.DataFrame(columns=keep_names), out_file)
+            else:
+                write_excel(FrameStream(keep_names, kept, spooled_chunks(spool)), out_file)
+                count_rows(rows_written=kept)
+                written = True
+            if written:
+                log.info(f"处理成功：{in_file.name} → {out_file.name}")
+            else:
+                log.info(f"处理成功：{in_file.name} → {out_file.name}（本次运行结束时写出）")
+        except Exception as e:
+            if len(specs) > 1:
+                log.error(f"处理失败：{in_file.name} → {out_file.name} | 错误：{str(e)}")
+            else:
+                log.error(f"处理失败：{in_file.name} | 错误：{str(e)}")
+        finally:
+            spool.close()
 
 # ===excel_like_filter函数对应的特定场景快捷调用 ===
+"""
+付邮/免邮筛选条件 (filter_dict, keep_columns, output_prefix) , 均基于 sys-yishupingtai.xlsx
+"""
+PAY_POSTAGE_SPEC = (
+    {
+        '是否需要邮费': ['付邮'],
+        '支付类型': ['微信']
+    },
+    ['快递单号', '借还书订单号', '图书馆名称', '流水订单号', '订单创建时间','订单状态', '支付类型', '收件人详细地址', '收件人名称', '实付金额-单位为分','是否需要邮费', '收件市', '区域类型', '区域标识'],
+    "_sys-ispay-1"
+)
+
+FREE_POSTAGE_SPEC = (
+    {
+        '是否需要邮费': ['免邮']
+    },
+    ['快递单号', '借还书订单号', '图书馆名称', '订单创建时间',
+    '是否需要邮费', '收件人名称', '收件市', '区域类型', '区域标识', '支付类型'],
+    "_sys-nopay"
+)
+
 def filter_pay_postage():
     """付邮筛选"""
     excel_like_filter(
         input_path="sys-yishupingtai.xlsx",
-        output_prefix="_sys-ispay-1",
-        filter_dict={
-            '是否需要邮费': ['付邮'],
-            '支付类型': ['微信']
-        },
-        keep_columns=['快递单号', '借还书订单号', '图书馆名称', '流水订单号', '订单创建时间','订单状态', '支付类型', '收件人详细地址', '收件人名称', '实付金额-单位为分','是否需要邮费', '收件市', '区域类型', '区域标识'],
+        specs=[PAY_POSTAGE_SPEC],
         enhanced=False
     )
 
@@ -327,12 +1303,15 @@ def filter_free_postage():
     """免邮筛选"""
     excel_like_filter(
         input_path="sys-yishupingtai.xlsx",
-        output_prefix="_sys-nopay",
-        filter_dict={
-            '是否需要邮费': ['免邮']
-        },
-        keep_columns=['快递单号', '借还书订单号', '图书馆名称', '订单创建时间',
-        '是否需要邮费', '收件人名称', '收件市', '区域类型', '区域标识', '支付类型'],
+        specs=[FREE_POSTAGE_SPEC],
+        enhanced=False
+    )
+
+def filter_postage_split():
+    """付邮+免邮筛选（一次读取 sys-yishupingtai.xlsx , 同时生成两个筛选结果 ; 同时指定S3、S5时执行 , 见 MERGED_STEPS）"""
+    excel_like_filter(
+        input_path="sys-yishupingtai.xlsx",
+        specs=[PAY_POSTAGE_SPEC, FREE_POSTAGE_SPEC],
         enhanced=False
     )
 
@@ -365,13 +1344,63 @@ def filter_foshan_orders():
     )
 
 # ====================== 功能4：数据比对与标记 ======================
+def write_marked_copy(source, output_path, marked_rows, fill, column=1, total=None, max_row=None):
+    """
+    流式复制工作表并给指定行的单元格填色（只读模式读入 , 只写模式写出 , 内存占用与表格大小无关）
+    :param source: 源文件路径（复制其活动工作表）
+    :param output_path: 标记后文件保存路径
+    :param marked_rows: 需要填色的行号（从1开始 , 含表头行）
+    :param fill: 填充样式
+    :param column: 填色的列号（默认第1列）
+    :param total: 总行数（用于进度条 , 未指定时取工作表维度）
+    :param max_row: 只复制前 max_row 行（读取时去除的表尾汇总行不写出）
+    """
+    from openpyxl import load_workbook, Workbook
+    from openpyxl.cell import WriteOnlyCell
+    marked_rows = set(int(row_num) for row_num in marked_rows)
+    wb_in = load_workbook(source, read_only=True)
+    ws_in = wb_in.active
+    total = total or ws_in.max_row
+    rows = ([cell.value for cell in row] for row in ws_in.iter_rows())
+
+    wb_out = Workbook(write_only=True)
+    ws_out = wb_out.create_sheet(ws_in.title)
+    progress = ProgressBar(total, desc=f"写出 {Path(output_path).name}")
+    try:
+        for row_num, values in enumerate(rows, start=1):
+            if max_row is not None and row_num > max_row:
+                break
+            progress.update()
+            values = list(values)
+            if row_num in marked_rows:
+                values += [None] * (column - len(values))
+                cell = WriteOnlyCell(ws_out, value=values[column - 1])
+                cell.fill = fill
+                values[column - 1] = cell
+            ws_out.append(values)
+        wb_out.save(output_path)
+    finally:
+        progress.close()
+        wb_in.close()
+
+def match_key_masks(keys_a, keys_b):
+    """
+    双向匹配两列单号
+    把两侧单号合并后统一编码（factorize）, 在整数编码上做 isin 比对 , 避免逐行的集合查找
+    返回 (A中出现在B的行掩码, B中未出现在A的行掩码) , 均为numpy布尔数组
+    """
+    codes, _ = pd.factorize(pd.concat([keys_a, keys_b], ignore_index=True), use_na_sentinel=False)
+    codes_a, codes_b = codes[:len(keys_a)], codes[len(keys_a):]
+    return np.isin(codes_a, codes_b), ~np.isin(codes_b, codes_a)
+
 def compare_and_highlight_general(
     sys_file: str, 
     ems_file: str,
     output_sys_marked: str,
     output_ems_marked: str,
     columns_to_keep: list,
-    invalid_replace: str = '无效单号'
+    invalid_replace: str = '无效单号',
+    history_lookup: bool = False
 ):
     """
     通用数据比对与标记函数
@@ -381,64 +1410,70 @@ def compare_and_highlight_general(
     :param output_ems_marked: 标红后快递文件保存路径
     :param columns_to_keep: 需要保留的列列表
     :param invalid_replace: 无效单号替换文本
+    :param history_lookup: 是否在快递单号历史索引中查找未匹配单号（其他月份的系统订单）
     """
     try:
-        # 读取数据（强制使用openpyxl引擎）
-        df_a = pd.read_excel(sys_file, dtype={'快递单号': str}, engine='openpyxl')
-        df_b = pd.read_excel(ems_file, dtype={'快递单号': str}, engine='openpyxl')
+        # 读取数据（读取引擎由 --engine 选择 , 优先使用上游步骤的内存产物）
+        df_a = read_frame(sys_file, dtype={'快递单号': str}, columns=['快递单号'] + columns_to_keep)
+        if Path(output_ems_marked).name in ARTIFACTS.wanted:
+            # 标红文件会被下游步骤直接读取：保留原始类型 , 快递单号另行转为文本用于比对
+            ems_frame = read_frame(ems_file)
+            df_b = ems_frame.copy()
+            df_b['快递单号'] = df_b['快递单号'].map(cell_text).astype(object)
+        else:
+            ems_frame = None
+            df_b = read_frame(ems_file, dtype={'快递单号': str})
     except Exception as e:
-        print(f"文件读取失败: {str(e)}")
+        log.error(f"文件读取失败: {str(e)}")
         return
 
     # 数据清洗
     df_a['快递单号'] = df_a['快递单号'].str.strip().replace(['0', ''], invalid_replace)
     df_b['快递单号'] = df_b['快递单号'].str.strip()
 
-    # 获取关键数据集
-    original_target_numbers = set(df_b['快递单号'])
-    target_numbers = set(df_a['快递单号'])
-
-    # 标黄操作
-    wb_a = load_workbook(sys_file)
-    ws_a = wb_a.active
+    # 向量化匹配：两侧单号统一编码后按编码比对
+    matched_mask, unmatched_mask = match_key_masks(df_a['快递单号'], df_b['快递单号'])
+    count_rows(matched=matched_mask.sum(), unmatched=unmatched_mask.sum())
+    if history_lookup and unmatched_mask.any() and os.path.exists(WAYBILL_INDEX_FILE):
+        with WaybillIndex() as index:
+            history = index.lookup(df_b['快递单号'][unmatched_mask].dropna())
+        history = history[history['来源文件'].str.startswith('sys-')]
+        if not history.empty:
+            count_rows(history_matched=history['快递单号'].nunique())
+            log.info(f"📚 未匹配单号中有 {history['快递单号'].nunique()} 条在历史订单中有记录")
+            log.debug(history.to_string(index=False))
+
+    from openpyxl.styles import PatternFill
     yellow_fill = PatternFill(start_color="FFFF00", fill_type="solid")
-    matching_results = []
-    
-    # 标红操作
-    wb_b = load_workbook(ems_file)
-    ws_b = wb_b.active
     red_fill = PatternFill(start_color="FF0000", fill_type="solid")
-    unmatched_results = []
-
-    # 处理标黄
-    for idx, row in df_a.iterrows():
-        if row['快递单号'] in original_target_numbers:
-            ws_a.cell(row=idx+2, column=1).fill = yellow_fill
-            matching_results.append(row.to_dict())
-            print(f"标黄：{row['快递单号']}")
-
-    # 处理标红
-    for idx, row in df_b.iterrows():
-        if row['快递单号'] not in target_numbers:
-            ws_b.cell(row=idx+2, column=1).fill = red_fill
-            unmatched_results.append(row.to_dict())
-            print(f"未匹配到：{row['快递单号']}")
-
-    # 保存标记文件
-    wb_a.save(output_sys_marked)
-    wb_b.save(output_ems_marked)
-
-    # 生成结果文件
-    matching_df = pd.DataFrame(matching_results)
+
+    # 标黄操作（系统文件总是读取文件夹中现有的文件 , 见 MANUAL_RENAMES）
+    write_marked_copy(sys_file, output_sys_marked, np.flatnonzero(matched_mask) + 2, yellow_fill,
+                      total=len(df_a) + 1)
+    if matched_mask.any() and log.isEnabledFor(logging.DEBUG):
+        log.debug("\n".join(f"标黄：{number}" for number in df_a['快递单号'][matched_mask]))
+
+    # 标红操作
+    write_marked_copy(ems_file, output_ems_marked, np.flatnonzero(unmatched_mask) + 2, red_fill,
+                      total=len(df_b) + 1, max_row=len(df_b) + 1 if trailer_rule(ems_file) else None)
+    if unmatched_mask.any() and log.isEnabledFor(logging.DEBUG):
+        log.debug("\n".join(f"未匹配到：{number}" for number in df_b['快递单号'][unmatched_mask]))
+
+    if ems_frame is not None:
+        ARTIFACTS.publish(output_ems_marked, ems_frame)
+
+    # 生成结果文件（无记录时与逐行收集时一致 , 输出不含表头的空表）
+    matching_df = df_a[matched_mask].reset_index(drop=True) if matched_mask.any() else pd.DataFrame()
+    unmatched_df = df_b[unmatched_mask].reset_index(drop=True) if unmatched_mask.any() else pd.DataFrame()
     if matching_df.empty:
-        print("警告：没有匹配到任何记录！")
+        log.warning("警告：没有匹配到任何记录！")
         return
 
     # 列存在性检查
     missing_columns = [col for col in columns_to_keep if col not in matching_df.columns]
     if missing_columns:
-        print(f"错误：以下列不存在: {missing_columns}")
-        print("当前数据列:", list(matching_df.columns))
+        log.error(f"错误：以下列不存在: {missing_columns}")
+        log.error(f"当前数据列: {list(matching_df.columns)}")
         return
 
     # 生成最终结果
@@ -448,16 +1483,16 @@ def compare_and_highlight_general(
         
         # 动态生成结果文件名
         base_name = os.path.splitext(output_sys_marked)[0]
-        matching_df.to_excel(f'{base_name}-匹配结果.xlsx', index=False)
-        pd.DataFrame(unmatched_results).to_excel(f'{base_name}-未匹配结果.xlsx', index=False)
+        write_frame(matching_df, f'{base_name}-匹配结果.xlsx')
+        write_frame(unmatched_df, f'{base_name}-未匹配结果.xlsx')
         
-        print(f"\n处理结果：{os.path.basename(sys_file)}")
-        print(f"✅ 标黄文件已保存: {output_sys_marked}")
-        print(f"✅ 标红文件已保存: {output_ems_marked}")
-        print(f"📊 匹配记录: {len(matching_df)} 条")
-        print(f"📊 未匹配记录: {len(unmatched_results)} 条")
+        log.info(f"\n处理结果：{os.path.basename(sys_file)}")
+        log.info(f"✅ 标黄文件已保存: {output_sys_marked}")
+        log.info(f"✅ 标红文件已保存: {output_ems_marked}")
+        log.info(f"📊 匹配记录: {len(matching_df)} 条")
+        log.info(f"📊 未匹配记录: {len(unmatched_df)} 条")
     except Exception as e:
-        print(f"保存结果失败: {str(e)}")
+        log.error(f"保存结果失败: {str(e)}")
 
 # ===compare_and_highlight_general函数对应的特定场景快捷调用 ===
 def compare_ispay():
@@ -497,7 +1532,8 @@ def compare_error():
         output_ems_marked='ems-errordata-marked.xlsx',
         columns_to_keep=[
             "快递单号", "借还书订单号", "图书馆名称", "订单创建时间", "订单类型", "是否需要邮费",  "收件人名称", "收件市", "区域类型", "区域标识", "实付金额-单位为分", "流水订单号"
-        ]
+        ],
+        history_lookup=True
     )
 
 # ====================== 功能5：生成最终付邮/免邮的对齐文件 ======================
@@ -568,8 +1604,8 @@ def process_excel_files(
     """
     try:
         # ====== 读取文件 ======
-        df_a = pd.read_excel(file_a_path)
-        df_b = pd.read_excel(file_b_path)
+        df_a = read_frame(file_a_path, columns=config['required_columns_a'] + config['a_columns_to_merge'])
+        df_b = read_frame(file_b_path)
 
         # ====== 校验必要列 ======
         required_columns = {
@@ -602,23 +1638,38 @@ def process_excel_files(
         df_b = df_b[config['new_column_order']]
 
         # ====== 合并数据 ======
-        merged = pd.merge(
-            df_b[['快递单号']],  # 保留B文件的快递单号顺序
-            df_a[config['a_columns_to_merge']],
-            on='快递单号',
-            how='left'
-        )
+        # 按快递单号为A文件建立哈希索引（重复单号取首次出现的记录）, 按位置取值填入B文件 , B文件行数与顺序不变
+        a_keys, b_keys = df_a['快递单号'], df_b['快递单号']
+        if pd.api.types.is_numeric_dtype(a_keys) != pd.api.types.is_numeric_dtype(b_keys):
+            # 一侧为数值、一侧为文本时统一转为文本再比对
+            a_keys, b_keys = a_keys.map(cell_text), b_keys.map(cell_text)
+        # 两侧单号统一编码（一次哈希）, 每个编码记录其在A文件中首次出现的行号
+        codes, uniques = pd.factorize(pd.concat([a_keys, b_keys], ignore_index=True), use_na_sentinel=False)
+        a_codes, b_codes = codes[:len(a_keys)], codes[len(a_keys):]
+        first_rows = np.full(len(uniques), -1, dtype=np.intp)
+        present_codes, first_index = np.unique(a_codes, return_index=True)
+        first_rows[present_codes] = first_index
+        key_counts = np.bincount(a_codes, minlength=len(uniques))
+        duplicate_keys = uniques[key_counts > 1]
+        if len(duplicate_keys):
+            sample = ', '.join(map(str, duplicate_keys[:5])) + (' ...' if len(duplicate_keys) > 5 else '')
+            log.warning(f"⚠️ A文件存在 {len(duplicate_keys)} 个重复快递单号（取首次出现的记录）：{sample}")
+            count_rows(duplicate_keys=len(duplicate_keys))
+        rows = first_rows[b_codes]  # B文件每行对应的A文件行号（-1为无匹配）
 
         # ====== 数据映射 ======
+        source = df_a[config['a_columns_to_merge']]
         for b_col, a_col in config['column_mapping'].items():
-            df_b[b_col] = merged[a_col]
+            values = pd.api.extensions.take(source[a_col].to_numpy(), rows, allow_fill=True)
+            df_b[b_col] = pd.Series(values, index=df_b.index)
 
         # ====== 保存结果 ======
-        df_b.to_excel(output_path, index=False)
+        write_frame(df_b, output_path)
         
         return {
             "status": "success",
-            "message": f"文件处理完成，已保存到：{output_path}",
+            "message": f"文件处理完成，已保存到：{output_path}"
+                       + (f"（A文件重复快递单号 {len(duplicate_keys)} 个 , 已取首次出现的记录）" if len(duplicate_keys) else ""),
             "output_path": output_path
         }
 
@@ -664,7 +1715,7 @@ def run_processing_task(task_config: dict) -> dict:
     包含任务执行结果的字典
     """
     start_time = time.time()
-    print(f"\n🔨 开始处理【{task_config['name']}】...")
+    log.info(f"\n🔨 开始处理【{task_config['name']}】...")
     
     result = process_excel_files(
         file_a_path=task_config['file_a'],
@@ -677,19 +1728,406 @@ def run_processing_task(task_config: dict) -> dict:
     status_icon = "✅" if result['status'] == "success" else "❌"
     elapsed_time = time.time() - start_time
     
-    print(f"{status_icon} 任务状态：{result['status'].upper()}")
-    print(f"📝 提示信息：{result['message']}")
-    print(f"⏱ 处理耗时：{elapsed_time:.2f}秒")
+    report = log.info if result['status'] == "success" else log.error
+    report(f"{status_icon} 任务状态：{result['status'].upper()}")
+    report(f"📝 提示信息：{result['message']}")
+    log.info(f"⏱ 处理耗时：{elapsed_time:.2f}秒")
     
     if result['status'] == "success":
-        print(f"📂 输出位置：{result['output_path']}")
+        log.info(f"📂 输出位置：{result['output_path']}")
     
     return result
 
+# ====================== 功能6：快递单号历史索引 ======================
+WAYBILL_INDEX_FILE = ".waybill_index.sqlite"
+
+"""
+写入快递单号索引的文件及其列映射（S13读取这些文件 , 执行S8/S9/S10时自动加入S13 , 每月的数据经过流水线后累积到同一索引中）
+order_id     -- 订单号列（快递账单无订单号）
+postage      -- 邮费列 , postage_scale 为换算为元的系数（如金额单位为分时为0.01）
+date         -- 用于确定数据所属月份的日期列（取出现最多的年月）
+"""
+WAYBILL_INDEX_SOURCES = {
+    'sys-yishupingtai.xlsx': {'order_id': '借还书订单号', 'postage': '实付金额-单位为分', 'postage_scale': 0.01, 'date': '订单创建时间'},
+    'sys-ispay.xlsx': {'order_id': '承接应用方订单id', 'postage': '应付金额', 'date': '创建时间'},
+    'sys-nopay.xlsx': {'order_id': '借还书订单号', 'postage': None, 'date': '订单创建时间'},
+    'ems-ispay-3513.xlsx': {'order_id': None, 'postage': '总邮资', 'date': '收寄时间'},
+    'ems-nopay-3404.xlsx': {'order_id': None, 'postage': '总邮资', 'date': '收寄时间'},
+    'ems-errordata.xlsx': {'order_id': None, 'postage': '总邮资', 'date': '收寄时间'}
+}
+
+class WaybillIndex:
+    """
+    按快递单号建立的本地历史索引（SQLite , 快递单号上建有B树索引 , 按单号查询为O(log n)）
+    每条记录包含 快递单号 / 月份 / 来源文件 / 订单号 / 邮费（元）
+    同一来源文件同一月份重新写入时先清除旧记录；文件未变化时跳过
+    """
+    def __init__(self, path=WAYBILL_INDEX_FILE):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS waybills (
+                waybill TEXT NOT NULL, month TEXT NOT NULL, source TEXT NOT NULL,
+                order_id TEXT, postage REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_waybill ON waybills (waybill);
+            CREATE INDEX IF NOT EXISTS idx_source ON waybills (source, month);
+            CREATE TABLE IF NOT EXISTS sources (
+                source TEXT NOT NULL, month TEXT NOT NULL, fingerprint TEXT, rows INTEGER, indexed_at TEXT,
+                PRIMARY KEY (source, month)
+            );
+        """)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @staticmethod
+    def fingerprint(path):
+        stat = os.stat(path)
+        return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+    @staticmethod
+    def detect_month(df, date_column, path):
+        """数据所属月份：日期列中出现最多的年月 , 无法识别时取文件修改时间"""
+        if date_column in df.columns:
+            months = pd.to_datetime(df[date_column], errors='coerce').dt.strftime('%Y-%m').dropna()
+            if not months.empty:
+                return months.mode().iloc[0]
+        return time.strftime('%Y-%m', time.localtime(os.path.getmtime(path)))
+
+    def is_indexed(self, source, fingerprint):
+        row = self.conn.execute("SELECT 1 FROM sources WHERE source = ? AND fingerprint = ?",
+                                (source, fingerprint)).fetchone()
+        return row is not None
+
+    def add_frame(self, df, source, month, mapping, fingerprint=None):
+        """写入一个文件的快递单号（空单号、0、无效单号不写入）, 返回写入条数"""
+        keys = df['快递单号'].map(cell_text).astype(object).str.strip()
+        valid = keys.notna() & ~keys.isin(['', '0', '无效单号'])
+        order_col, postage_col = mapping.get('order_id'), mapping.get('postage')
+        order_ids = df[order_col].map(cell_text) if order_col in df.columns else pd.Series(None, index=df.index)
+        postage = (pd.to_numeric(df[postage_col], errors='coerce') * mapping.get('postage_scale', 1)
+                   if postage_col in df.columns else pd.Series(np.nan, index=df.index))
+        records = pd.DataFrame({'waybill': keys, 'order_id': order_ids, 'postage': postage})[valid]
+        rows = [(w, month, source, None if pd.isna(o) else o, None if pd.isna(p) else float(p))
+                for w, o, p in records.itertuples(index=False)]
+        with self.conn:
+            self.conn.execute("DELETE FROM waybills WHERE source = ? AND month = ?", (source, month))
+            self.conn.executemany("INSERT INTO waybills VALUES (?, ?, ?, ?, ?)", rows)
+            self.conn.execute("INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?, ?)",
+                              (source, month, fingerprint, len(rows), time.strftime('%Y-%m-%d %H:%M:%S')))
+        return len(rows)
+
+    def lookup(self, waybills) -> pd.DataFrame:
+        """按快递单号查询所有月份的记录"""
+        keys = list(dict.fromkeys(str(w).strip() for w in waybills))
+        frames = []
+        for i in range(0, len(keys), 500):  # SQLite单条语句的参数个数有上限
+            chunk = keys[i:i+500]
+            frames.append(pd.read_sql_query(
+                f"SELECT waybill AS 快递单号, month AS 月份, source AS 来源文件, order_id AS 订单号, postage AS 邮费 "
+                f"FROM waybills WHERE waybill IN ({','.join('?' * len(chunk))}) ORDER BY waybill, month",
+                self.conn, params=chunk))
+        if not frames:
+            return pd.DataFrame(columns=['快递单号', '月份', '来源文件', '订单号', '邮费'])
+        return pd.concat(frames, ignore_index=True)
+
+def index_columns(source) -> list:
+    """写入索引需要读取的列（非索引来源文件返回空列表）"""
+    mapping = WAYBILL_INDEX_SOURCES.get(Path(source).name)
+    if mapping is None:
+        return []
+    return ['快递单号'] + [mapping[k] for k in ('order_id', 'postage', 'date') if mapping.get(k)]
+
+def index_source(index, source, df, month=None):
+    """把一个来源文件的数据写入索引 , 返回写入条数"""
+    mapping = WAYBILL_INDEX_SOURCES[source]
+    if '快递单号' not in df.columns:
+        raise ValueError("缺少快递单号列")
+    source_month = month or WaybillIndex.detect_month(df, mapping.get('date'), source)
+    count = index.add_frame(df, source, source_month, mapping, WaybillIndex.fingerprint(source))
+    count_rows(indexed=count)
+    log.info(f"📚 已索引：{source}（{source_month}）{count} 条")
+    return count
+
+def update_waybill_index(month: str = None):
+    """将本月的系统订单与快递账单写入快递单号历史索引（未变化的文件跳过）"""
+    with WaybillIndex() as index:
+        for source in WAYBILL_INDEX_SOURCES:
+            if not os.path.exists(source):
+                continue
+            if index.is_indexed(source, WaybillIndex.fingerprint(source)):
+                log.info(f"⏩ 索引已是最新：{source}")
+                continue
+            try:
+                index_source(index, source, read_frame(source, columns=index_columns(source)), month)
+            except Exception as e:
+                log.error(f"索引失败：{source} | 错误：{str(e)}")
+
+def lookup_waybills(waybills: list):
+    """查询快递单号在各月份的记录并输出"""
+    if not os.path.exists(WAYBILL_INDEX_FILE):
+        log.warning(f"⚠️ 索引文件不存在：{WAYBILL_INDEX_FILE}（执行 S13 或 S8/S9/S10 后建立）")
+        return
+    with WaybillIndex() as index:
+        result = index.lookup(waybills)
+    if result.empty:
+        log.info("未找到任何记录")
+        return
+    log.info(result.to_string(index=False))
+
 # ====================== 执行控制核心 ======================
+"""
+各步骤读写的文件声明（用于构建依赖图 , 无依赖关系的步骤并行执行）
+inputs  -- 步骤读取的文件
+outputs -- 步骤新建、改写、删除或改名的文件（原地修改的文件同时出现在inputs和outputs中）
+S0的目标文件由命令行参数决定 , 见 PipelineController.step_io
+"""
+STEP_IO = {
+    'S1': {
+        'inputs': ['易书平台订单表.xlsx'],
+        'outputs': ['result_cleaned_易书平台订单表.xlsx', '易书平台订单表.xlsx']  # 原文件会被删除
+    },
+    'S2': {
+        'inputs': ['3404 7月.xlsx', '3513 7月.xlsx', '订单中心数据表-爱阅有约或科图承接.xlsx',
+                   '订单中心数据表-易书承接.xlsx', 'result_cleaned_易书平台订单表.xlsx'],
+        'outputs': ['3404 7月.xlsx', '3513 7月.xlsx', '订单中心数据表-爱阅有约或科图承接.xlsx',
+                    '订单中心数据表-易书承接.xlsx', 'result_cleaned_易书平台订单表.xlsx',
+                    'ems-nopay-3404.xlsx', 'ems-ispay-3513.xlsx', 'sys-aiyueyouyue.xlsx',
+                    'sys-yishuchenjie.xlsx', 'sys-yishupingtai.xlsx']
+    },
+    'S3': {'inputs': ['sys-yishupingtai.xlsx'], 'outputs': ['sys-yishupingtai_sys-ispay-1.xlsx']},
+    'S4': {'inputs': ['sys-yishuchenjie.xlsx'], 'outputs': ['sys-yishuchenjie_sys-ispay-2.xlsx']},
+    'S5': {'inputs': ['sys-yishupingtai.xlsx'], 'outputs': ['sys-yishupingtai_sys-nopay.xlsx']},
+    'S6': {
+        'inputs': ['sys-yishuchenjie.xlsx', 'sys-aiyueyouyue.xlsx'],
+        'outputs': ['sys-yishuchenjie_sys-zslib.xlsx', 'sys-aiyueyouyue_sys-zslib.xlsx']
+    },
+    'S7': {'inputs': ['sys-aiyueyouyue.xlsx'], 'outputs': ['sys-aiyueyouyue_sys-fslib.xlsx']},
+    'S8': {
+        'inputs': ['sys-ispay.xlsx', 'ems-ispay-3513.xlsx'],
+        'outputs': ['sys-ispay-marked.xlsx', 'ems-ispay-3513-marked.xlsx',
+                    'sys-ispay-marked-匹配结果.xlsx', 'sys-ispay-marked-未匹配结果.xlsx']
+    },
+    'S9': {
+        'inputs': ['sys-nopay.xlsx', 'ems-nopay-3404.xlsx'],
+        'outputs': ['sys-nopay-marked.xlsx', 'ems-nopay-3404-marked.xlsx',
+                    'sys-nopay-marked-匹配结果.xlsx', 'sys-nopay-marked-未匹配结果.xlsx']
+    },
+    'S10': {
+        'inputs': ['sys-yishupingtai.xlsx', 'ems-errordata.xlsx', WAYBILL_INDEX_FILE],  # 历史提示读取索引
+        'outputs': ['sys-yishupingtai-marked.xlsx', 'ems-errordata-marked.xlsx',
+                    'sys-yishupingtai-marked-匹配结果.xlsx', 'sys-yishupingtai-marked-未匹配结果.xlsx']
+    },
+    'S11': {
+        'inputs': ['sys-ispay-marked-匹配结果.xlsx', 'ems-ispay-3513-marked.xlsx'],
+        'outputs': ['ems-ispay-3513-marked-end-result.xlsx']
+    },
+    'S12': {
+        'inputs': ['sys-nopay-marked-匹配结果.xlsx', 'ems-nopay-3404-marked.xlsx'],
+        'outputs': ['ems-nopay-3404-marked-end-result.xlsx']
+    },
+    'S13': {
+        'inputs': list(WAYBILL_INDEX_SOURCES) + [WAYBILL_INDEX_FILE],
+        'outputs': [WAYBILL_INDEX_FILE]
+    }
+}
+
+"""
+读取同一文件的筛选步骤同时指定时合并执行（合并步骤 → 成员步骤）:
+输入只读取一次 , 按各成员的条件一次筛选并分别写出 , 执行清单仍按成员步骤分别记录
+"""
+MERGED_STEPS = {
+    'S3+S5': ('S3', 'S5')
+}
+
+"""
+快递单号历史索引只由S13写入：指定比对步骤（S8/S9/S10）时自动加入S13 , 排在第一个比对步骤之前
+（S10的历史提示读取本次更新后的索引 ; 索引与来源文件未变化时S13按执行清单跳过）
+"""
+INDEX_STEP = 'S13'
+INDEXED_STEPS = ('S8', 'S9', 'S10')
+
+"""
+S8/S9读取的文件由筛选结果人工确认后改名而来（改名后的文件 → 筛选结果）
+筛选结果总是写出供人工核对 , 不作为改名后文件的内存产物 , 依赖图中也不视为同一文件（S8/S9总是读取文件夹中现有的文件）
+（sys-ispay.xlsx 的列与S8、S11需要的列一致的是S4的筛选结果 , S3的筛选结果仅供核对）
+"""
+MANUAL_RENAMES = {
+    'sys-ispay.xlsx': 'sys-yishuchenjie_sys-ispay-2.xlsx',
+    'sys-nopay.xlsx': 'sys-yishupingtai_sys-nopay.xlsx'
+}
+
+"""
+仅供下游步骤读取的中间文件：同一次运行中被下游步骤消费时先在内存中传递 , 运行结束时再写出（--materialize 时生成后立即写出）
+"""
+INTERMEDIATE_FILES = {
+    'sys-ispay-marked-匹配结果.xlsx',
+    'sys-nopay-marked-匹配结果.xlsx'
+}
+
+def io_conflict(earlier: dict, later: dict) -> bool:
+    """两个步骤在同一文件上是否存在 写后读 / 读后写 / 写后写 关系"""
+    earlier_in, earlier_out = set(earlier['inputs']), set(earlier['outputs'])
+    later_in, later_out = set(later['inputs']), set(later['outputs'])
+    return bool((earlier_out & later_in) or (earlier_in & later_out) or (earlier_out & later_out))
+
+def build_step_graph(steps: list, step_io: dict) -> dict:
+    """
+    根据文件读写关系构建步骤依赖图
+    同一文件上存在 写后读 / 读后写 / 写后写 关系的两个步骤 , 按命令行给定的先后顺序执行
+    :param steps: 步骤序列（命令行顺序）
+    :param step_io: {步骤: {'inputs': [...], 'outputs': [...]}}
+    :return: {步骤: 依赖的步骤集合}
+    """
+    graph = {step: set() for step in steps}
+    for i, later in enumerate(steps):
+        for earlier in steps[:i]:
+            if io_conflict(step_io[earlier], step_io[later]):
+                graph[later].add(earlier)
+    return graph
+
+# --- 增量执行清单 ---
+MANIFEST_FILE = ".pipeline_manifest.json"
+
+class BuildManifest:
+    """
+    记录每个步骤上次成功执行时的 输入文件哈希 / 配置指纹 / 输出文件哈希
+    输入与配置均未变化且输出文件仍存在的步骤可直接跳过（类似make）
+    文件哈希按 (大小, 修改时间) 缓存 , 未变化的大文件无需重复计算
+    """
+    def __init__(self, path=MANIFEST_FILE):
+        self.path = Path(path)
+        self.data = {'files': {}, 'steps': {}}
+        if self.path.exists():
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    self.data = json.load(f)
+            except (OSError, ValueError) as e:
+                log.warning(f"⚠️ 执行清单读取失败，将全部重新执行：{str(e)}")
+
+    def save(self):
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+
+    def digest(self, name):
+        """计算文件内容哈希（文件不存在返回None）"""
+        try:
+            stat = os.stat(name)
+        except FileNotFoundError:
+            return None
+        cached = self.data['files'].get(name)
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2]
+        sha = hashlib.sha256()
+        with open(name, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                sha.update(block)
+        self.data['files'][name] = [stat.st_size, stat.st_mtime_ns, sha.hexdigest()]
+        return sha.hexdigest()
+
+    def is_up_to_date(self, step, io, fingerprint):
+        """判断步骤是否可跳过"""
+        entry = self.data['steps'].get(step)
+        if not entry or entry['config'] != fingerprint:
+            return False
+        # 输出文件只需存在（下游步骤通过自身输入哈希感知其内容变化 , 人工修正后的输出不会被覆盖）
+        for name in io['outputs']:
+            if name not in io['inputs'] and self.digest(name) is None and not self.consumed(step, name):
+                return False
+        for name in io['inputs']:
+            # 原地修改的文件与上次执行后的结果比较
+            expected = entry['outputs'][name] if name in io['outputs'] else entry['inputs'].get(name)
+            current = self.digest(name)
+            if current != expected and not (current is None and self.consumed(step, name)):
+                return False
+        return True
+
+    def consumed(self, step, name):
+        """文件是否已被其他步骤改名/删除（如S2重命名S0、S1的结果）"""
+        return any(
+            other != step and name in entry['outputs'] and entry['outputs'][name] is None
+            for other, entry in self.data['steps'].items()
+        )
+
+    def record(self, step, io, fingerprint, input_digests, output_digests, started_at):
+        """
+        记录步骤执行结果
+        仅输出（非原地修改）的文件必须在本次执行中生成或更新 , 否则视为执行失败不做记录
+        （改名得到的文件保留原修改时间 , 因此同时比较执行前后的哈希）
+        """
+        for name in io['outputs']:
+            if name in io['inputs']:
+                continue
+            if not os.path.exists(name):
+                self.data['steps'].pop(step, None)
+                return False
+            if os.path.getmtime(name) < started_at and self.digest(name) == output_digests.get(name):
+                self.data['steps'].pop(step, None)
+                return False
+        self.data['steps'][step] = {
+            'config': fingerprint,
+            'inputs': input_digests,
+            'outputs': {name: self.digest(name) for name in io['outputs']}
+        }
+        return True
+
+def group_by_shared_inputs(steps: list, step_io: dict) -> list:
+    """把读取相同文件的步骤分到同一组（同组步骤在同一进程中依次执行 , 共享读取缓存）"""
+    groups = []
+    for step in steps:
+        names = set(step_io[step]['inputs'])
+        merged = [group for group in groups if group[1] & names]
+        for group in merged:
+            groups.remove(group)
+        groups.append((
+            [s for group in merged for s in group[0]] + [step],
+            names.union(*(group[1] for group in merged))
+        ))
+    return [sorted(group[0], key=steps.index) for group in groups]
+
+def _run_steps_in_worker(cmd_args, steps, wanted, deferred, frames):
+    """
+    进程池中依次执行一组步骤（子进程内重建控制器）
+    返回 [(步骤, 耗时, 新发布的产物, 错误信息, 处理统计)]
+    """
+    if not log.handlers:  # spawn方式启动的子进程需重新配置日志
+        setup_logging(getattr(cmd_args, 'quiet', False), getattr(cmd_args, 'log_file', None))
+    controller = PipelineController(cmd_args)
+    RUN_OPTIONS['jobs'] = 1  # 步骤已在进程池中并行 , 步骤内不再开启进程池
+    ARTIFACTS.reset(wanted, deferred, frames)
+    results = []
+    for step in steps:
+        start_time = time.time()
+        ARTIFACTS.published = {}
+        STEP_STATS.clear()
+        try:
+            with controller.instrument_step(step):
+                result = controller.step_functions[step]()
+            error = result.get('message') if step_status(result) == "failed" else None
+            results.append((step, time.time() - start_time, ARTIFACTS.published, error, dict(STEP_STATS)))
+        except Exception as e:
+            results.append((step, time.time() - start_time, {}, f"{type(e).__name__} | {str(e)}", dict(STEP_STATS)))
+    READ_CACHE.clear()
+    return results
+
 class PipelineController:
     def __init__(self, cmd_args):
         self.args = cmd_args  # 保存命令行参数
+        self.manifest = None  # 增量执行清单（execute_pipeline 中加载）
+        self.failed = set()   # 最近一次执行中失败的步骤
+        RUN_OPTIONS['explain_filters'] = getattr(cmd_args, 'explain_filters', False)
+        RUN_OPTIONS['progress'] = getattr(cmd_args, 'progress', False)
+        RUN_OPTIONS['jobs'] = getattr(cmd_args, 'jobs', None) or 1
+        RUN_OPTIONS['stream_rows'] = getattr(cmd_args, 'stream_rows', None) or 0
         self.step_functions = {
             'S0': self.dynamic_delete_step, # 删除指定文件最后一行有效数据
             'S1': cleaning, # 数据清洗
@@ -697,13 +2135,15 @@ class PipelineController:
             'S3': filter_pay_postage, # 付邮筛选
             'S4': filter_wechat_pay, # 微信支付筛选 , 仅适用于：当S3筛选无数据时启用
             'S5': filter_free_postage, # 免邮筛选
+            'S3+S5': filter_postage_split, # 付邮+免邮筛选（同时指定S3、S5时自动合并）
             'S6': filter_zhongshan_orders, # 中山纪念图书馆的数据筛选
             'S7': filter_foshan_orders, # 佛山市图书馆的数据筛选
             'S8': compare_ispay, # 匹配付邮订单
             'S9': compare_nopay, # 匹配免邮订单
             'S10': compare_error, # 匹配错入格口订单
             'S11': self.process_s8_final,  # 匹配付邮最终处理
-            'S12': self.process_s9_final   # 匹配免邮最终处理
+            'S12': self.process_s9_final,  # 匹配免邮最终处理
+            'S13': self.update_index_step  # 更新快递单号历史索引
         }
 
     def process_s8_final(self):
@@ -715,7 +2155,7 @@ class PipelineController:
                 "file_b": "ems-ispay-3513-marked.xlsx",
                 "output": "ems-ispay-3513-marked-end-result.xlsx"
             }
-            run_processing_task(task_config)
+            return run_processing_task(task_config)
 
     def process_s9_final(self):
         """处理免邮订单的最终对齐文件"""
@@ -726,7 +2166,11 @@ class PipelineController:
             "file_b": "ems-nopay-3404-marked.xlsx",
             "output": "ems-nopay-3404-marked-end-result.xlsx"
         }
-        run_processing_task(task_config)
+        return run_processing_task(task_config)
+
+    def update_index_step(self):
+        """更新快递单号历史索引（--month 指定数据所属月份 , 默认按数据中的日期识别）"""
+        update_waybill_index(month=getattr(self.args, 'month', None))
 
     def dynamic_delete_step(self):
             """动态删除步骤（实例方法）"""
@@ -734,25 +2178,639 @@ class PipelineController:
             files = self.args.del_files or ["3513 7月.xlsx", "3404 7月.xlsx"]
             sheet = self.args.del_sheet  # 允许为None
             
-            print(f"\n🔧 删除行配置：")
-            print(f"   ▸ 目标文件: {files}")
-            print(f"   ▸ 指定工作表: {sheet if sheet else '自动选择首表'}")
+            log.info(f"\n🔧 删除行配置：")
+            log.info(f"   ▸ 目标文件: {files}")
+            log.info(f"   ▸ 指定工作表: {sheet if sheet else '自动选择首表'}")
 
             delete_last_row_enhanced(
                 excel_paths=files,
                 sheet_name=sheet
             )
 
+    def step_io(self, step):
+        """获取步骤的输入/输出文件声明（合并步骤为各成员的并集）"""
+        if step in MERGED_STEPS:
+            members = [self.step_io(member) for member in MERGED_STEPS[step]]
+            return {key: list(dict.fromkeys(name for io in members for name in io[key])) for key in ('inputs', 'outputs')}
+        if step == 'S0':
+            files = self.args.del_files or ["3513 7月.xlsx", "3404 7月.xlsx"]
+            return {'inputs': list(files), 'outputs': list(files)}
+        return STEP_IO[step]
+
+    def step_config(self, step):
+        """获取步骤的配置指纹（步骤函数源码 + 配置字典 + 相关命令行参数）"""
+        func = self.step_functions[step]
+        try:
+            source = inspect.getsource(func)
+        except (OSError, TypeError):
+            source = func.__qualname__
+        extra = {
+            'S0': {'del_sheet': self.args.del_sheet},
+            'S3': PAY_POSTAGE_SPEC,
+            'S5': FREE_POSTAGE_SPEC,
+            'S11': CONFIG_S8,
+            'S12': CONFIG_S9,
+            'S13': {'sources': WAYBILL_INDEX_SOURCES, 'month': getattr(self.args, 'month', None)}
+        }.get(step)
+        payload = source + json.dumps(extra, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def should_skip(self, step):
+        """步骤输入与配置均未变化时跳过（--force 强制执行 , 读取本次运行内存产物的步骤总是执行）"""
+        if self.manifest is None:
+            return False
+        if step in MERGED_STEPS:
+            return all(self.should_skip(member) for member in MERGED_STEPS[step])
+        if set(self.step_io(step)['inputs']) & ARTIFACTS.frames.keys():
+            return False
+        return self.manifest.is_up_to_date(step, self.step_io(step), self.step_config(step))
+
+    def plan_artifacts(self, steps, graph):
+        """找出本次运行中会被下游步骤读取的文件 , 以及其中可以延迟到运行结束时写出的中间文件"""
+        wanted = set()
+        for consumer in steps:
+            consumer_inputs = set(self.step_io(consumer)['inputs'])
+            for producer in graph[consumer]:
+                wanted |= set(self.step_io(producer)['outputs']) & consumer_inputs
+        deferred = set() if getattr(self.args, 'materialize', False) else wanted & INTERMEDIATE_FILES
+        return wanted, deferred
+
+    def check_manual_renames(self, steps):
+        """提示：同一次运行中生成的筛选结果需人工确认改名后 , 下次运行才会被S8/S9读取"""
+        for consumer in steps:
+            for name in self.step_io(consumer)['inputs']:
+                source = MANUAL_RENAMES.get(name)
+                producers = [s for s in steps if source in self.step_io(s)['outputs']]
+                if producers:
+                    log.warning(f"⚠️ {consumer} 读取文件夹中现有的 {name}（由 {producers[0]} 的筛选结果 {source} "
+                                f"人工确认后改名得到 , 本次生成的筛选结果不会被 {consumer} 直接使用）")
+
+    def add_index_step(self, steps):
+        """指定比对步骤而未指定S13时 , 在第一个比对步骤之前加入S13"""
+        if INDEX_STEP in steps or not any(step in INDEXED_STEPS for step in steps):
+            return steps
+        position = next(i for i, step in enumerate(steps) if step in INDEXED_STEPS)
+        log.info(f"📚 自动加入 {INDEX_STEP}（比对步骤读取的订单与账单写入快递单号历史索引）")
+        return steps[:position] + [INDEX_STEP] + steps[position:]
+
+    def merge_steps(self, steps):
+        """
+        同时指定的可合并步骤替换为合并步骤（位于第一个成员的位置）
+        成员之间的其他步骤与靠后的成员存在读写冲突时不合并 , 保持命令行给定的先后顺序
+        """
+        for merged, members in MERGED_STEPS.items():
+            if not all(member in steps for member in members):
+                continue
+            positions = sorted(steps.index(member) for member in members)
+            if any(io_conflict(self.step_io(other), self.step_io(member))
+                   for other in steps[positions[0]:positions[-1]] if other not in members
+                   for member in members if steps.index(member) > steps.index(other)):
+                continue
+            first = steps[positions[0]]
+            steps = [merged if step == first else step for step in steps if step == first or step not in members]
+        return steps
+
+    def begin_step(self, step):
+        """执行前记录输入/输出文件哈希与开始时间（合并步骤按成员分别记录）"""
+        if self.manifest is None:
+            return None
+        if step in MERGED_STEPS:
+            return {member: self.begin_step(member) for member in MERGED_STEPS[step]}
+        io = self.step_io(step)
+        input_digests = {name: self.manifest.digest(name) for name in io['inputs']}
+        output_digests = {name: self.manifest.digest(name) for name in io['outputs']}
+        return input_digests, output_digests, time.time()
+
+    def finish_step(self, step, token):
+        """执行后更新执行清单"""
+        if self.manifest is None or token is None:
+            return
+        if step in MERGED_STEPS:
+            for member, member_token in token.items():
+                self.finish_step(member, member_token)
+            return
+        input_digests, output_digests, started_at = token
+        io = self.step_io(step)
+        if set(io['inputs'] + io['outputs']) & ARTIFACTS.deferred:
+            self.pending_records.append((step, token))  # 中间文件写出后再记录
+            return
+        if not self.manifest.record(step, io, self.step_config(step), input_digests, output_digests, started_at):
+            log.warning(f"⚠️ {step} 未生成全部输出文件，下次将重新执行")
+        self.manifest.save()
+
+    def write_deferred(self):
+        """运行结束时写出延迟落盘的中间文件 , 再记录读写这些文件的步骤（输入哈希按写出的文件计算）"""
+        for name in ARTIFACTS.write_deferred():
+            log.info(f"💾 已写出中间文件：{name}")
+        pending, self.pending_records = self.pending_records, []
+        for step, (input_digests, output_digests, started_at) in pending:
+            io = self.step_io(step)
+            input_digests = {name: self.manifest.digest(name) if name in ARTIFACTS.deferred else digest
+                             for name, digest in input_digests.items()}
+            if not self.manifest.record(step, io, self.step_config(step), input_digests, output_digests, started_at):
+                log.warning(f"⚠️ {step} 未生成全部输出文件，下次将重新执行")
+        if pending:
+            self.manifest.save()
+
     def execute_pipeline(self, steps):
-        """执行流水线操作"""
-        print(f"🏁 开始执行流程：{' → '.join(steps)}")
+        """执行流水线操作（按文件依赖关系调度 , 互不依赖的步骤并行执行）"""
+        log.info(f"🏁 开始执行流程：{' → '.join(steps)}")
         for step in steps:
-            if step in self.step_functions:
-                print(f"\n🔧 正在执行 {step}")
-                self.step_functions[step]()  # 调用绑定方法
+            if step not in self.step_functions:
+                log.warning(f"⚠️ 未知步骤：{step}")
+        # 同一步骤重复指定时只执行一次
+        steps = self.merge_steps(self.add_index_step(list(dict.fromkeys(step for step in steps if step in self.step_functions))))
+        graph = build_step_graph(steps, {step: self.step_io(step) for step in steps})
+        self.check_manual_renames(steps)
+
+        self.manifest = None if getattr(self.args, 'force', False) else BuildManifest()
+
+        if getattr(self.args, 'plan', False):
+            self.print_plan(steps, graph)
+            return
+
+        ARTIFACTS.reset(*self.plan_artifacts(steps, graph))
+        self.summaries = []  # 本次执行的各步骤摘要
+        self.pending_records = []  # 读写延迟落盘文件的步骤 , 写出后再记录到执行清单
+        self.failed = set()  # 执行失败（及因上游失败而跳过）的步骤
+        jobs = getattr(self.args, 'jobs', None) or 1
+        try:
+            if jobs <= 1 or len(steps) <= 1:
+                for i, step in enumerate(steps):
+                    if graph[step] & self.failed:
+                        log.info(f"\n⏭️ 跳过 {step}（依赖步骤 {', '.join(sorted(graph[step] & self.failed))} 执行失败）")
+                        self.failed.add(step)
+                        continue
+                    if self.should_skip(step):
+                        log.info(f"\n⏩ {step} 输入与配置未变化，已跳过")
+                        continue
+                    log.info(f"\n🔧 正在执行 {step}")
+                    token = self.begin_step(step)
+                    STEP_STATS.clear()
+                    start_time = time.time()
+                    try:
+                        with self.instrument_step(step):
+                            status = step_status(self.step_functions[step]())  # 调用绑定方法
+                    except Exception:
+                        self.failed.add(step)
+                        self.summaries.append(step_summary(step, time.time() - start_time, status="failed"))
+                        raise
+                    if status == "ok":
+                        self.finish_step(step, token)
+                    else:
+                        self.failed.add(step)
+                    self.summaries.append(step_summary(step, time.time() - start_time, status=status))
+                    # 释放后续步骤不再读取的工作簿缓存
+                    READ_CACHE.retain({name for later in steps[i+1:] for name in self.step_io(later)['inputs']})
             else:
-                print(f"⚠️ 未知步骤：{step}")
-        print("\n✅ 所有指定步骤执行完成")
+                self.run_parallel(steps, graph, jobs)
+        finally:
+            # 步骤失败时同样写出已生成的中间文件 , 避免交付文件停留在上次运行的结果
+            self.write_deferred()
+        ARTIFACTS.reset()  # 释放内存产物
+        READ_CACHE.clear()
+        if getattr(self.args, 'profile', None):
+            profile_report(self.args.profile, self.summaries)
+        if getattr(self.args, 'mem_report', False):
+            memory_report(self.summaries)
+        log.info("\n✅ 所有指定步骤执行完成")
+
+    def instrument_step(self, step):
+        """步骤执行时的统计上下文（--profile 性能剖析 , --mem-report 内存统计）"""
+        import contextlib
+        stack = contextlib.ExitStack()
+        if getattr(self.args, 'mem_report', False):
+            stack.enter_context(StepMemory(step))
+        directory = getattr(self.args, 'profile', None)
+        if directory:
+            stack.enter_context(StepProfiler(step, directory, stacks=getattr(self.args, 'profile_stacks', False)))
+        return stack
+
+    def run_parallel(self, steps, graph, jobs):
+        """
+        使用进程池执行依赖图 , 步骤失败时跳过其下游步骤
+        同时就绪且读取相同文件的步骤在同一进程中依次执行 , 每个工作簿只解析一次
+        """
+        pending = {step: set(deps) for step, deps in graph.items()}
+        failed = self.failed
+        running = {}
+        tokens = {}
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            while pending or running:
+                # 上游失败的步骤直接跳过
+                for step in [s for s, deps in pending.items() if deps & failed]:
+                    log.info(f"\n⏭️ 跳过 {step}（依赖步骤 {', '.join(sorted(pending[step] & failed))} 执行失败）")
+                    failed.add(step)
+                    del pending[step]
+                # 提交所有依赖已完成的步骤（按命令行顺序）
+                ready = [s for s in steps if s in pending and not pending[s]]
+                to_run = []
+                for step in ready:
+                    del pending[step]
+                    if self.should_skip(step):
+                        log.info(f"\n⏩ {step} 输入与配置未变化，已跳过")
+                        for deps in pending.values():
+                            deps.discard(step)
+                        continue
+                    to_run.append(step)
+                for group in group_by_shared_inputs(to_run, {step: self.step_io(step) for step in to_run}):
+                    log.info(f"\n🔧 正在执行 {', '.join(group)}")
+                    inputs = set()
+                    for step in group:
+                        tokens[step] = self.begin_step(step)
+                        inputs |= set(self.step_io(step)['inputs'])
+                    frames = {name: df for name, df in ARTIFACTS.frames.items() if name in inputs}
+                    future = pool.submit(_run_steps_in_worker, self.args, group,
+                                         ARTIFACTS.wanted, ARTIFACTS.deferred, frames)
+                    running[future] = group
+                if not running:
+                    if ready:
+                        continue  # 跳过的步骤可能使下游步骤就绪
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    group = running.pop(future)
+                    try:
+                        results = future.result()
+                    except Exception as e:
+                        results = [(step, 0.0, {}, f"{type(e).__name__} | {str(e)}", {}) for step in group]
+                    for step, elapsed, published, error, stats in results:
+                        if error is None:
+                            ARTIFACTS.frames.update(published)
+                            log.info(f"\n✔️ {step} 完成（耗时 {elapsed:.1f}s）")
+                            self.finish_step(step, tokens[step])
+                            self.summaries.append(step_summary(step, elapsed, stats=stats))
+                        else:
+                            failed.add(step)
+                            log.error(f"\n❌ {step} 执行失败：{error}")
+                            self.summaries.append(step_summary(step, elapsed, status="failed", stats=stats))
+                        for deps in pending.values():
+                            deps.discard(step)
+
+    def watch(self, steps):
+        """
+        常驻监视当前文件夹：步骤读取的文件新增或改动 , 且 --settle 秒内不再变化、为完整的xlsx后 , 自动执行指定步骤
+        （输入未变化的步骤按执行清单跳过 , 相当于只执行受影响的步骤链）
+        进程常驻 , pandas等库只导入一次 , 重复读取的工作簿由 .excel_cache 直接加载
+        """
+        names = sorted({name for step in steps if step in self.step_functions for name in self.step_io(step)['inputs']})
+        settle = self.args.settle
+        watcher = FolderWatcher('.', poll=self.args.poll, interval=settle)
+        log.info(f"👀 正在监视 {os.getcwd()}（{watcher.mode}）, 文件稳定 {settle} 秒后执行：{' → '.join(steps)} , 按 Ctrl+C 退出")
+        try:
+            baseline = None
+            while True:
+                if baseline is not None:
+                    watcher.wait()
+                    current = folder_snapshot(names)
+                    if not any(current[name] != baseline.get(name) for name in current):
+                        baseline = current  # 只有文件被删除或改名
+                        continue
+                    # 防抖：复制中的文件大小/修改时间仍在变化 , 或xlsx的zip结构不完整（超时后照常执行 , 由步骤报告文件问题）
+                    deadline = time.monotonic() + max(WATCH_SETTLE_TIMEOUT, settle)
+                    while True:
+                        time.sleep(settle)
+                        latest = folder_snapshot(names)
+                        arrived = [name for name in latest if latest[name] != baseline.get(name)]
+                        incomplete = [name for name in arrived
+                                      if name.lower().endswith('.xlsx') and not zipfile.is_zipfile(name)]
+                        if latest == current and not incomplete:
+                            break
+                        if time.monotonic() >= deadline:
+                            log.warning(f"⚠️ 等待文件稳定超时（{WATCH_SETTLE_TIMEOUT}秒）, 照常执行："
+                                        f"{', '.join(incomplete or arrived)}")
+                            break
+                        current = latest
+                    log.info(f"\n📥 检测到文件变化：{', '.join(arrived)}")
+                try:
+                    self.execute_pipeline(steps)
+                except Exception as e:
+                    log.error(f"❌ 执行失败：{str(e)}")
+                watcher.drain()  # 忽略步骤自身写出文件产生的事件
+                baseline = folder_snapshot(names)
+                log.info(f"\n👀 继续监视（{time.strftime('%H:%M:%S')}）")
+        except KeyboardInterrupt:
+            log.info("\n🛑 已停止监视")
+        finally:
+            watcher.close()
+
+    def print_plan(self, steps, graph):
+        """打印执行计划（按层级 , 同一层级的步骤可并行执行）"""
+        level = {}
+        will_run = {}
+        for step in steps:
+            level[step] = max((level[dep] + 1 for dep in graph[step]), default=0)
+            # 上游步骤需要重新执行时 , 下游步骤的输入也会变化
+            will_run[step] = any(will_run[dep] for dep in graph[step]) or not self.should_skip(step)
+        log.info("\n📋 执行计划：")
+        for depth in range(max(level.values(), default=-1) + 1):
+            batch = [step if will_run[step] else f"{step}(跳过)" for step in steps if level[step] == depth]
+            log.info(f"   第{depth+1}批: {', '.join(batch)}")
+        for step in steps:
+            if graph[step]:
+                log.info(f"   ▸ {step} 依赖 {', '.join(sorted(graph[step], key=steps.index))}")
+
+# ====================== 文件夹监视（--watch） ======================
+"""
+--watch 时等待到达的文件稳定（大小与修改时间不再变化、xlsx结构完整）的最长时间（秒）
+"""
+WATCH_SETTLE_TIMEOUT = 300
+
+class FolderWatcher:
+    """
+    等待文件夹中的文件变化：Linux上使用inotify（阻塞等待 , 不占用CPU）, 其他系统或网络共享目录（--poll）定时轮询
+    只负责唤醒 , 哪些文件有变化由调用方比较快照得出
+    """
+    # IN_MODIFY | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_CLOSE_WRITE
+    INOTIFY_EVENTS = 0x2 | 0x40 | 0x80 | 0x100 | 0x200 | 0x8
+
+    def __init__(self, folder, poll=False, interval=3.0):
+        self.interval = interval
+        self.fd = None if poll else self.open_inotify(folder)
+
+    @property
+    def mode(self):
+        return "inotify" if self.fd is not None else f"每{self.interval}秒轮询"
+
+    @classmethod
+    def open_inotify(cls, folder):
+        """创建inotify监视 , 不可用时返回None"""
+        if not sys.platform.startswith('linux'):
+            return None
+        try:
+            import ctypes
+            import ctypes.util
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        except (OSError, AttributeError):
+            return None
+        if fd < 0:
+            return None
+        if libc.inotify_add_watch(fd, os.fsencode(os.path.abspath(folder)), cls.INOTIFY_EVENTS) < 0:
+            os.close(fd)
+            return None
+        return fd
+
+    def wait(self):
+        """等待下一次变化（轮询模式等待一个间隔）"""
+        if self.fd is None:
+            time.sleep(self.interval)
+            return
+        import select
+        select.select([self.fd], [], [])
+        self.drain()
+
+    def drain(self):
+        """丢弃已产生的事件"""
+        if self.fd is None:
+            return
+        try:
+            while os.read(self.fd, 65536):
+                pass
+        except BlockingIOError:
+            pass
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+def folder_snapshot(names):
+    """文件的 (大小, 修改时间) 快照（忽略不存在的文件）"""
+    snapshot = {}
+    for name in names:
+        try:
+            stat = os.stat(name)
+        except FileNotFoundError:
+            continue
+        snapshot[name] = (stat.st_size, stat.st_mtime_ns)
+    return snapshot
+
+# ====================== 性能剖析（--profile） ======================
+"""
+--profile 时每个步骤在 cProfile 下执行 , 统计写入 <目录>/<步骤>.prof（python -m pstats、snakeviz 等工具可直接打开）
+--profile-stacks 同时定时采样调用栈 , 写入 <目录>/<步骤>.collapsed（折叠栈格式 , flamegraph.pl、speedscope 可直接生成火焰图）
+全部步骤结束后打印热点函数排名 , 以及各步骤耗时中CPU计算与等待（磁盘读写、进程调度等）的占比
+"""
+PROFILE_TOP_FUNCTIONS = 20
+STACK_SAMPLE_INTERVAL = 0.005  # 调用栈采样间隔（秒）
+
+class StackSampler:
+    """后台线程定时采样指定线程的调用栈 , 按折叠栈（调用链以分号连接）累计采样次数"""
+    def __init__(self, thread_id: int, interval: float = STACK_SAMPLE_INTERVAL):
+        import threading
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = {}
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="StackSampler", daemon=True)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                key = ';'.join(reversed(stack))
+                self.counts[key] = self.counts.get(key, 0) + 1
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in sorted(self.counts.items()):
+                f.write(f"{stack} {count}\n")
+
+class StepProfiler:
+    """
+    单个步骤的性能剖析（cProfile统计与可选的调用栈采样）
+    步骤的CPU时间记入处理统计（cpu_seconds）, 进程池模式下随步骤结果回传主进程
+    """
+    def __init__(self, step: str, directory, stacks: bool = False):
+        self.step = step
+        self.directory = Path(directory)
+        self.stacks = stacks
+
+    def __enter__(self):
+        import cProfile
+        import threading
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.sampler = StackSampler(threading.get_ident()) if self.stacks else None
+        self.profile = cProfile.Profile()
+        self.cpu_start = time.process_time()
+        if self.sampler:
+            self.sampler.start()
+        self.profile.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profile.disable()
+        if self.sampler:
+            self.sampler.stop()
+            self.sampler.write(self.directory / f"{self.step}.collapsed")
+        # 包含步骤内后台线程（如xlsx写出线程）的CPU时间
+        STEP_STATS['cpu_seconds'] = round(time.process_time() - self.cpu_start, 3)
+        self.profile.dump_stats(str(self.directory / f"{self.step}.prof"))
+        return False
+
+def function_label(func) -> str:
+    """pstats中的函数标识 (文件, 行号, 函数名) 转为简短描述"""
+    filename, line, name = func
+    if filename == '~':  # 内置函数
+        return name
+    return f"{name} ({Path(filename).name}:{line})"
+
+def profile_report(directory, summaries: list, top: int = PROFILE_TOP_FUNCTIONS):
+    """打印本次执行的各步骤合计的热点函数排名 , 以及CPU计算与等待时间的占比"""
+    import pstats
+    directory = Path(directory)
+    files = [str(directory / f"{s['step']}.prof") for s in summaries if (directory / f"{s['step']}.prof").exists()]
+    if not files:
+        return
+    stats = pstats.Stats(*files)
+    ranked = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:top]
+    lines = [f"{'自身耗时':>8} {'累计耗时':>8} {'调用次数':>10}  函数"]
+    for func, (_, calls, tottime, cumtime, _) in ranked:
+        lines.append(f"{tottime:>11.2f}s {cumtime:>11.2f}s {calls:>13}  {function_label(func)}")
+    log.info(f"\n🔥 热点函数（{', '.join(s['step'] for s in summaries)} 合计 , 按自身耗时排序）：\n" + "\n".join(lines))
+
+    lines = [f"{'步骤':<6} {'耗时':>8} {'CPU':>8} {'等待':>8}"]
+    total_wall = total_cpu = total_wait = 0.0
+    for s in summaries:
+        if 'cpu_seconds' not in s:
+            continue
+        wall, cpu = s['elapsed'], s['cpu_seconds']
+        wait_time = max(wall - cpu, 0.0)
+        total_wall += wall
+        total_cpu += cpu
+        total_wait += wait_time
+        lines.append(f"{s['step']:<8} {wall:>9.2f}s {cpu:>8.2f}s {wait_time:>8.2f}s")
+    if total_wall:
+        busy = total_cpu + total_wait
+        lines.append(f"{'合计':<6} {total_wall:>9.2f}s {total_cpu:>8.2f}s {total_wait:>8.2f}s"
+                     f"（CPU计算 {total_cpu / busy:.0%} , 等待磁盘读写等 {total_wait / busy:.0%}）")
+        log.info("\n⚖️ CPU计算与等待时间（CPU时间含后台写出线程 , 可能超过步骤耗时）：\n" + "\n".join(lines))
+    log.info(f"📂 剖析结果：{directory}（python -m pstats {directory / (summaries[0]['step'] + '.prof')}）")
+
+# ====================== 内存统计（--mem-report） ======================
+"""
+--mem-report 时记录每个步骤的峰值常驻内存（RSS）与 tracemalloc 统计的内存分配峰值 , 并在步骤结束时列出
+步骤中加载的各个表格及占用最多的列（excelIO.record_frame）
+Linux下每个步骤开始时重置进程的峰值RSS（/proc/self/clear_refs）, 无法重置时记录的是进程启动以来的峰值
+-j 大于1时 S0、S6 等按文件并行处理的步骤 , 峰值RSS取主进程与各子进程中的最大值（tracemalloc只统计主进程）
+tracemalloc 会使执行明显变慢 , 仅用于排查内存问题
+"""
+def reset_peak_rss() -> bool:
+    """重置当前进程的峰值RSS（仅Linux）, 成功返回True"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def peak_rss_mb():
+    """当前进程的峰值RSS（MB）, 无法获取时返回None"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / 2**20 if sys.platform == 'darwin' else peak / 1024, 1)  # macOS单位为字节 , Linux为KB
+
+class StepMemory:
+    """单个步骤的内存统计 , 结果记入处理统计（peak_rss_mb、traced_peak_mb）随步骤摘要输出"""
+    def __init__(self, step: str):
+        self.step = step
+
+    def __enter__(self):
+        import tracemalloc
+        FRAME_MEMORY.clear()
+        self.rss_reset = reset_peak_rss()
+        self.started = not tracemalloc.is_tracing()
+        if self.started:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        return self
+
+    def __exit__(self, *exc_info):
+        import tracemalloc
+        _, traced_peak = tracemalloc.get_traced_memory()
+        if self.started:
+            tracemalloc.stop()
+        rss = peak_rss_mb()
+        child_rss = STEP_STATS.get('peak_rss_mb')
+        if child_rss is not None:
+            rss = max(rss or 0, child_rss)
+        if rss is not None:
+            STEP_STATS['peak_rss_mb'] = rss
+        STEP_STATS['traced_peak_mb'] = round(traced_peak / 2**20, 1)
+        scope = "" if self.rss_reset else "（进程启动以来）"
+        lines = [f"🧠 {self.step} 内存：峰值RSS{scope} {rss if rss is not None else '-'}MB , "
+                 f"tracemalloc峰值 {STEP_STATS['traced_peak_mb']}MB"]
+        if FRAME_MEMORY:
+            lines.append(frame_memory_report())
+        log.info("\n".join(lines))
+        return False
+
+def memory_report(summaries: list):
+    """全部步骤结束后按峰值RSS从高到低列出各步骤的内存统计"""
+    rows = [s for s in summaries if 'traced_peak_mb' in s]
+    if not rows:
+        return
+    lines = [f"{'步骤':<6} {'峰值RSS':>10} {'tracemalloc峰值':>16}"]
+    for s in sorted(rows, key=lambda s: s.get('peak_rss_mb') or 0, reverse=True):
+        rss = s.get('peak_rss_mb')
+        lines.append(f"{s['step']:<8} {(f'{rss}MB' if rss is not None else '-'):>10} {s['traced_peak_mb']:>15}MB")
+    log.info("\n🧠 各步骤内存峰值：\n" + "\n".join(lines))
+
+# ====================== 启动耗时检查 ======================
+"""
+以 python -X importtime 运行 --help , 检查模块导入耗时是否超出预算 , 以及是否提前加载了表格处理库
+（表格处理库应在步骤首次读写表格时才加载 , 见 lazy_import）
+"""
+STARTUP_IMPORT_BUDGET_MS = 200
+HEAVY_MODULES = ('pandas', 'numpy', 'openpyxl', 'pyarrow', 'python_calamine')
+
+def check_startup(budget_ms=STARTUP_IMPORT_BUDGET_MS):
+    """返回是否通过检查"""
+    import subprocess
+    result = subprocess.run([sys.executable, '-X', 'importtime', os.path.abspath(__file__), '--help'],
+                            capture_output=True, text=True)
+    total_us, slowest, heavy = 0, [], []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len('import time:'):].split('|'))
+        if name.split('.')[0] in HEAVY_MODULES:
+            heavy.append(name.split('.')[0])
+        if not line.split('|')[2].startswith('  '):  # 只统计顶层导入（子模块已计入上层）
+            total_us += int(cumulative)
+            slowest.append((int(cumulative), name))
+    total_ms = total_us / 1000
+    log.info(f"⏱️ 启动导入耗时：{total_ms:.0f}ms（预算 {budget_ms}ms）")
+    for cumulative, name in sorted(slowest, reverse=True)[:5]:
+        log.info(f"   {cumulative / 1000:>7.1f}ms  {name}")
+    if heavy:
+        log.error(f"❌ 启动时加载了表格处理库：{', '.join(dict.fromkeys(heavy))}")
+    if total_ms > budget_ms:
+        log.error(f"❌ 启动导入耗时超出预算 {total_ms - budget_ms:.0f}ms")
+    return not heavy and total_ms <= budget_ms
 
 # ====================== 主程序执行示例 ======================
 if __name__ == "__main__":
@@ -762,16 +2820,77 @@ if __name__ == "__main__":
         parser.add_argument('-s', '--steps', 
                             nargs='+',
                             # default=['S0',S1','S2','S3','S4','S5','S8','S9','S6','S7','S10','S11','S12'], # 默认按此顺序自动执行
-                            required=True,  # 必填参数
-                            help="指定执行步骤序列（默认顺序：S0 S1 S2 S3 S4 S5 S8 S9 S6 S7 S10 S11 S12）")
+                            help="指定执行步骤序列（默认顺序：S0 S1 S2 S3 S4 S5 S8 S9 S6 S7 S10 S11 S12 S13）")
         parser.add_argument('--del-files', nargs='+', 
                        help="指定需要删除行的文件列表")
         parser.add_argument('--del-sheet', 
                         help="指定统一工作表名称（可选）")
+        parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help="并行执行互不依赖步骤 , 以及步骤内多个文件（如S0、S6）的进程数（默认1 , 即顺序执行）")
+        parser.add_argument('--plan', action='store_true',
+                        help="仅打印按依赖关系生成的执行计划 , 不执行")
+        parser.add_argument('--force', action='store_true',
+                        help="忽略执行清单 , 强制重新执行所有指定步骤")
+        parser.add_argument('--materialize', action='store_true',
+                        help="中间文件（如匹配结果）生成后立即写出xlsx（默认被本次运行中的下游步骤读取时 , 在运行结束时写出）")
+        parser.add_argument('--explain-filters', action='store_true',
+                        help="打印每次筛选的条件执行顺序与选择率")
+        parser.add_argument('--stream-rows', type=int, metavar='N',
+                        help="筛选步骤（S3、S5、S6、S7等）按每N行分块读取与筛选 , 保留的行暂存于临时文件后写出 , 用于内存放不下的大文件")
+        parser.add_argument('--month',
+                        help="S13写入索引的数据所属月份（如 2025-07 , 默认按数据中的日期识别）")
+        parser.add_argument('--lookup', nargs='+', metavar='快递单号',
+                        help="在快递单号历史索引中查询单号的各月记录（不执行步骤）")
+        parser.add_argument('-q', '--quiet', action='store_true',
+                        help="终端只输出警告与错误")
+        parser.add_argument('--progress', action='store_true',
+                        help="显示逐行处理的进度条（行数、速度、预计剩余时间）")
+        parser.add_argument('--log-file',
+                        help="将完整日志（含逐行明细 , 如每个标黄/未匹配单号）写入指定文件")
+        parser.add_argument('--engine', choices=['auto', 'calamine', 'openpyxl', 'pandas', 'csv'],
+                        help="xlsx读取引擎（默认auto：已安装python-calamine时使用calamine , 否则openpyxl按值读取 ; csv读取同名CSV导出文件）")
+        parser.add_argument('--watch', action='store_true',
+                        help="常驻监视当前文件夹 , 步骤读取的文件到达或改动后自动执行指定步骤（Ctrl+C 退出）")
+        parser.add_argument('--settle', type=float, default=3.0,
+                        help="--watch 时文件保持不变多少秒后视为复制完成（默认3秒）")
+        parser.add_argument('--poll', action='store_true',
+                        help="--watch 时定时轮询代替inotify（网络共享目录等不支持inotify的场景）")
+        parser.add_argument('--check-startup', action='store_true',
+                        help=f"检查启动导入耗时（预算 {STARTUP_IMPORT_BUDGET_MS}ms , 且不提前加载pandas等表格处理库）, 未通过时返回非0")
+        parser.add_argument('--profile', nargs='?', const='profile', metavar='DIR',
+                        help="逐步骤性能剖析：cProfile统计写入 DIR/<步骤>.prof（默认目录 profile）, 结束时打印热点函数与CPU/等待时间占比")
+        parser.add_argument('--profile-stacks', action='store_true',
+                        help="--profile 时同时采样调用栈 , 写入 DIR/<步骤>.collapsed（火焰图折叠栈格式）")
+        parser.add_argument('--mem-report', action='store_true',
+                        help="记录每个步骤的峰值内存（RSS与tracemalloc）及加载的各表格、各列的内存占用（tracemalloc会使执行变慢）")
+        parser.add_argument('--no-cache', action='store_true',
+                        help="不使用 .excel_cache 列式缓存 , 每次都重新解析xlsx")
         args = parser.parse_args()
+        setup_logging(args.quiet, args.log_file)
+        if args.no_cache:
+            os.environ['EXCEL_CACHE'] = '0'  # 通过环境变量传给进程池中的子进程
+        if args.engine:
+            os.environ['EXCEL_ENGINE'] = args.engine
+        if args.mem_report:
+            os.environ['EXCEL_MEM_REPORT'] = '1'  # 表格内存记录（excelIO.record_frame）, 同样传给进程池中的子进程
+        if args.profile_stacks and not args.profile:
+            args.profile = 'profile'
+        if args.check_startup:
+            sys.exit(0 if check_startup() else 1)
+        if args.lookup:
+            lookup_waybills(args.lookup)
+            sys.exit(0)
+        if not args.steps:
+            parser.error("请通过 -s/--steps 指定执行步骤")
         # 创建控制器并执行
         controller = PipelineController(args)  # 注入命令行参数
-        controller.execute_pipeline(args.steps)
+        if args.watch:
+            controller.watch(args.steps)
+        else:
+            controller.execute_pipeline(args.steps)
+            if controller.failed:
+                log.error(f"❌ 执行失败的步骤：{', '.join(sorted(controller.failed))}")
+                sys.exit(1)
 
 '''
 删除最后一行有效数据执行方法（详细）
@@ -783,6 +2902,7 @@ py reName.py -s S0 --del-files "3513 4月.xlsx" "3404 4月.xlsx" --del-sheet "
 ======
 
 # 邮政提供的订单表数据 删除最后一行
+# （可省略：读取账单时按 TRAILER_RULES 自动去除末尾合计行 , 原始文件不做改写）
 py reName.py -s S0
 py reName.py -s S0 --del-files "3513 4月.xlsx" "3404 4月.xlsx" --del-sheet "工作表名"
 
@@ -790,7 +2910,7 @@ py reName.py -s S0 --del-files "3513 4月.xlsx" "3404 4月.xlsx" --del-sheet "
 py reName.py -s S1 S2
 
 # 付邮/免邮筛选 生成sys-ispay.xlsx/sys-nopay.xlsx文件
-py reName.py -s S3 S4 S5
+py reName.py -s S3 S4 S5 # S3与S5读取同一文件 , 同时指定时合并为一次筛选（S3+S5）
 
 # 匹配付邮订单数据
 py reName.py -s S8
@@ -817,6 +2937,56 @@ py reName.py -s S10
 ems-errordata-marked.xlsx
 sys-yishupingtai-marked-匹配结果.xlsx
 
+# 按文件依赖关系并行执行（互不依赖的步骤同时执行 , -j 指定进程数 , 默认顺序执行）
+py reName.py -s S3 S4 S5 S6 S7 -j 4
+py reName.py -s S0 S1 S2 S3 S4 S5 S8 S9 S6 S7 S10 S11 S12 --plan # 仅查看执行计划
+py reName.py -s S6 -j 2 # 单个步骤处理多个文件时（S6筛选两个订单中心文件）按文件并行 , 日志按文件顺序输出
+
+# 增量执行：输入文件与配置未变化的步骤自动跳过（记录于 .pipeline_manifest.json）
+py reName.py -s S8 S9 S11 S12 # 仅重新执行输入有变化的步骤
+py reName.py -s S8 --force # 忽略执行清单强制执行
+
+# 同一次运行中上游步骤的结果直接在内存中传递给下游步骤（如 S8 → S11 的匹配结果）, 中间文件在运行结束时写出
+py reName.py -s S8 S9 S11 S12
+py reName.py -s S8 S9 S11 S12 --materialize # 中间文件 sys-*-marked-匹配结果.xlsx 生成后立即写出
+
+# 快递单号历史索引：指定S8/S9/S10时自动在比对前执行S13写入本月订单与账单 , 可查询任意月份的单号记录（S10同时提示错入格口单号的历史记录）
+py reName.py -s S13 # 单独更新索引（如只执行了筛选的月份）
+py reName.py -s S13 --month 2025-07 # 指定数据所属月份
+py reName.py --lookup 1100000000001 1100000000002
+
+# 日志与进度：终端只显示步骤级信息与每个步骤的JSON摘要 , 逐行明细写入日志文件
+py reName.py -s S8 S9 --progress --log-file run.log # 显示进度条 , 每个标黄/未匹配单号记录在 run.log
+py reName.py -s S8 S9 -q # 只输出警告与错误
+
+# 读取缓存：每个工作簿首次读取后在 .excel_cache 中保存Feather副本（需安装pyarrow , 按文件内容哈希 , 文件改名后仍可命中 , 2/3/6/7/8 号脚本共用）
+py reName.py -s S6 S7 --force # 再次读取同一内容的文件时直接加载缓存
+py reName.py -s S6 S7 --force --no-cache # 不使用缓存
+
+# 读取引擎：先对比各引擎的读取结果与耗时 , 再按需指定（结果与pandas默认读取一致的引擎才会被推荐）
+py excelIO.py "3513 7月.xlsx" "3404 7月.xlsx" --str-column 快递单号
+py -m pytest tests # 引擎一致性测试（合成工作簿 , 各可用引擎与pandas默认读取结果逐列比对）
+py reName.py -s S8 S9 --engine calamine
+
+# 启动耗时：pandas等表格处理库在首次读写表格时才加载 , -s S2、--help、--plan 无需等待导入
+py reName.py --check-startup # 检查启动导入耗时是否在预算内（可加入提交前检查）
+
+# 常驻监视：每月把账单与订单导出文件放入文件夹后自动执行（文件复制完成后才开始 , 只执行输入有变化的步骤）
+py reName.py -s S1 S2 S3 S4 S5 --watch
+py reName.py -s S1 S2 S3 S4 S5 --watch --poll --settle 10 # 网络共享目录：轮询 , 文件10秒不变后执行
+
+# 分块筛选：超大的订单导出文件按每5万行分块读取筛选 , 峰值内存取决于块大小 , 输出与整表读取时完全相同
+py reName.py -s S3 S5 --stream-rows 50000
+
+# 性能剖析：月底执行变慢时定位耗时所在（读取、逐行循环、保存等）
+py reName.py -s S8 S9 --profile # 每个步骤的统计写入 profile/S8.prof 等 , 结束时打印热点函数与CPU/等待时间占比
+py reName.py -s S8 --profile prof-07 --profile-stacks # 同时输出 prof-07/S8.collapsed , 用 flamegraph.pl 或 speedscope 生成火焰图
+python -m pstats profile/S8.prof # 交互查看（sort cumtime / stats 20）
+
+# 内存统计：定位占用内存最多的步骤、表格与列（可针对性地改列类型或只读取需要的列）
+py reName.py -s S3 S5 S8 S9 --mem-report # 每个步骤结束时列出峰值RSS、tracemalloc峰值与各表格占用最多的列
+set EXCEL_MEM_REPORT=1 && py 2.filterDataEveryMonthFixed.py # 2/6/7/8 号脚本加载文件后同样列出表格的内存占用
+
 '''
 
 
@@ -1,5 +1,6 @@
 import pandas as pd
 import os
+from excelIO import read_excel_cached
 
 def compare_express_numbers(file_a, file_b, sheet_name, col_name):
     """
@@ -7,8 +8,8 @@ def compare_express_numbers(file_a, file_b, sheet_name, col_name):
     """
     try:
         # 读取Excel文件，指定列为字符串类型
-        df_a = pd.read_excel(file_a, sheet_name=sheet_name, dtype={col_name: str})
-        df_b = pd.read_excel(file_b, sheet_name=sheet_name, dtype={col_name: str})
+        df_a = read_excel_cached(file_a, sheet_name=sheet_name, dtype={col_name: str})
+        df_b = read_excel_cached(file_b, sheet_name=sheet_name, dtype={col_name: str})
         
         # 提取单号列并去重
         nums_a = set(df_a[col_name].dropna().astype(str).str.strip())
@@ -7,6 +7,7 @@ import re
 from datetime import datetime
 import time
 import sys
+from excelIO import read_excel_cached, write_excel, record_frame, frame_memory_report, mem_report_enabled
 
 def excel_data_analyzer():
     """
@@ -42,13 +43,16 @@ def excel_data_analyzer():
     
     try:
         # 读取Excel文件
-        df = pd.read_excel(file_path)
+        df = record_frame(os.path.basename(file_path), read_excel_cached(file_path))
         original_rows, original_cols = df.shape
         load_time = time.time() - start_time
         
         # 显示文件基本信息
         print(f"\n✅ 文件加载成功！耗时: {load_time:.2f}秒")
         print(f"📊 数据维度: {original_rows} 行, {original_cols} 列")
+        if mem_report_enabled():
+            # EXCEL_MEM_REPORT=1 时列出各列的内存占用
+            print(f"\n🧠 内存占用:\n{frame_memory_report()}")
         
         # 显示列信息
         print("\n🔍 数据列信息:")
@@ -252,7 +256,7 @@ def general_data_analysis(df):
             if not export_path.lower().endswith('.xlsx'):
                 export_path += '.xlsx'
             
-            export_df.to_excel(export_path, index=False)
+            write_excel(export_df, export_path)
             print(f"\n✅ 筛选结果已导出至: {os.path.abspath(export_path)}")
             print(f"📊 导出数据: {export_df.shape[0]} 行, {export_df.shape[1]} 列")
         except Exception as e:
@@ -0,0 +1,18 @@
+'''
+流水线基准测试（无需真实客户数据）
+1、synthdata -- 生成与真实导出文件结构一致的合成工作簿（易书平台订单表、两个订单中心数据表、3513/3404邮政账单、错入格口数据）
+2、runner    -- 在临时文件夹中逐个执行 S0–S12 , 记录每个步骤的耗时与峰值内存 , 结果保存为JSON并与基线对比
+
+用法（在仓库根目录执行）：
+py -m benchmark --rows 10000 100000
+py -m benchmark --rows 10000 --save-baseline # 保存为基线
+py -m benchmark --rows 10000 --threshold 0.2 # 任一步骤比基线慢20%以上（或峰值内存高20%以上）时返回非0
+py -m benchmark --rows 2000000 --steps S1 S2 S3 S5 -- --stream-rows 100000 # -- 之后的参数原样传给 1.reName.py
+py -m benchmark.synthdata 10000 ./data --match-rate 0.9 # 只生成数据
+'''
+import sys
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent  # 1.reName.py 与 excelIO.py 所在目录
+if str(REPO_DIR) not in sys.path:
+    sys.path.insert(0, str(REPO_DIR))
@@ -0,0 +1,60 @@
+"""命令行入口：py -m benchmark（参数见 --help）"""
+import sys
+import argparse
+
+from benchmark import REPO_DIR
+from benchmark.runner import (DEFAULT_STEPS, DEFAULT_THRESHOLD, compare, failed_steps,
+                              load_json, run_benchmark, save_json)
+
+DEFAULT_RESULT = REPO_DIR / 'benchmark' / 'results.json'
+DEFAULT_BASELINE = REPO_DIR / 'benchmark' / 'baseline.json'
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        prog='py -m benchmark',
+        description="用合成数据逐步骤测量流水线的耗时与峰值内存 , 与基线对比（-- 之后的参数原样传给 1.reName.py）")
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000],
+                        help="平台订单表与订单中心数据表的行数 , 可指定多组（默认10000 , 建议范围1万–200万）")
+    parser.add_argument('--match-rate', type=float, default=0.9,
+                        help="账单中能在系统订单中找到的快递单号比例（默认0.9）")
+    parser.add_argument('--seed', type=int, default=1, help="合成数据的随机种子（默认1）")
+    parser.add_argument('-s', '--steps', nargs='+', default=DEFAULT_STEPS,
+                        help=f"执行的步骤（默认 {' '.join(DEFAULT_STEPS)}）")
+    parser.add_argument('--data-dir', help="合成数据保存位置（默认系统临时文件夹 , 同一组参数只生成一次）")
+    parser.add_argument('-o', '--output', default=str(DEFAULT_RESULT),
+                        help="结果JSON文件（默认 benchmark/results.json）")
+    parser.add_argument('--baseline', default=str(DEFAULT_BASELINE),
+                        help="基线JSON文件（默认 benchmark/baseline.json）")
+    parser.add_argument('--save-baseline', action='store_true', help="将本次结果保存为基线")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help=f"回归阈值 , 任一步骤耗时或峰值内存超出基线该比例时返回非0（默认 {DEFAULT_THRESHOLD}）")
+    parser.add_argument('--keep-work', action='store_true', help="保留各组数据的工作文件夹（输出文件与日志）")
+    parser.add_argument('pipeline_args', nargs=argparse.REMAINDER, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    pipeline_args = args.pipeline_args[1:] if args.pipeline_args[:1] == ['--'] else args.pipeline_args
+
+    result = run_benchmark(args.rows, args.steps, args.match_rate, args.seed, pipeline_args,
+                           args.data_dir, args.keep_work)
+    save_json(result, args.output)
+    print(f"\n💾 结果已保存：{args.output}")
+
+    failures = failed_steps(result)
+    regressions = []
+    if args.save_baseline:
+        save_json(result, args.baseline)
+        print(f"📌 已保存为基线：{args.baseline}")
+    else:
+        try:
+            baseline = load_json(args.baseline)
+        except FileNotFoundError:
+            print(f"⚠️ 基线文件不存在：{args.baseline}（使用 --save-baseline 保存）")
+        else:
+            regressions = compare(result, baseline, args.threshold)
+
+    for failure in failures:
+        print(f"❌ 步骤失败：{failure}")
+    for regression in regressions:
+        print(f"🐢 性能回归：{regression}")
+    if failures or regressions:
+        sys.exit(1)
+    print("🏁 基准测试通过")
@@ -0,0 +1,192 @@
+'''
+逐个步骤执行流水线 , 记录耗时与峰值内存 , 结果保存为JSON并与基线对比
+每个步骤在独立的子进程中执行（py 1.reName.py -s 步骤 -j 1 --force）:
+    wall        -- 子进程总耗时（含解释器启动与导入）
+    elapsed     -- 步骤摘要（📋）中记录的步骤执行耗时
+    peak_rss_mb -- 子进程的峰值常驻内存（os.wait4 , Windows 下不记录）
+每组行数在新建的临时文件夹中从原始导出文件开始执行 , S3/S4/S5 的筛选结果按每月实际操作改名后供 S8/S9 读取
+'''
+from __future__ import annotations
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import importlib.util
+import subprocess
+from pathlib import Path
+
+from benchmark import REPO_DIR
+from benchmark.synthdata import RAW_FILES
+
+PIPELINE = REPO_DIR / '1.reName.py'
+DEFAULT_STEPS = ['S0', 'S1', 'S2', 'S3', 'S4', 'S5', 'S8', 'S9', 'S6', 'S7', 'S10', 'S11', 'S12']
+
+def load_manual_renames() -> dict:
+    """读取流程脚本中的 MANUAL_RENAMES（改名后的文件 → 筛选结果）, 与流程保持同一份定义（脚本名含点号 , 按路径加载）"""
+    spec = importlib.util.spec_from_file_location('reName', PIPELINE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return dict(module.MANUAL_RENAMES)
+
+"""
+筛选结果人工确认后改名：每个步骤执行后 , 把新生成的筛选结果复制为改名后的文件（模拟人工确认）
+"""
+MANUAL_RENAMES = load_manual_renames()
+
+"""
+回归判定：比基线慢 threshold 以上（且至少慢 MIN_REGRESSION_SECONDS 秒）,
+或峰值内存高 threshold 以上（且至少高 MIN_REGRESSION_RSS_MB）, 绝对差值下限用于忽略小数据量下的计时抖动
+"""
+DEFAULT_THRESHOLD = 0.2
+MIN_REGRESSION_SECONDS = 0.5
+MIN_REGRESSION_RSS_MB = 10
+
+def dataset_dir(data_dir, rows: int, match_rate: float, seed: int) -> Path:
+    """获取（必要时生成）一组合成数据 , 同一组参数只生成一次"""
+    path = Path(data_dir) / f'rows{rows}-match{match_rate:g}-seed{seed}'
+    marker = path / '.complete'
+    if not marker.exists():
+        print(f"🏭 生成合成数据：{rows} 行 , 匹配率 {match_rate:g}（{path}）")
+        # 在子进程中生成：本进程不加载pandas , 子进程继承的峰值内存（ru_maxrss）不会被抬高
+        subprocess.run([sys.executable, '-m', 'benchmark.synthdata', str(rows), str(path),
+                        '--match-rate', str(match_rate), '--seed', str(seed)], cwd=REPO_DIR, check=True)
+        marker.touch()
+    return path
+
+def step_summary_from_log(log_file: Path, step: str) -> dict:
+    """从日志文件中取出步骤的JSON摘要（📋）"""
+    summary = {}
+    try:
+        with open(log_file, encoding='utf-8') as f:
+            for line in f:
+                if '📋 ' not in line:
+                    continue
+                try:
+                    record = json.loads(line.split('📋 ', 1)[1])
+                except ValueError:
+                    continue
+                if record.get('step') == step:
+                    summary = record
+    except OSError:
+        pass
+    return summary
+
+def run_step(step: str, work_dir: Path, pipeline_args: list) -> dict:
+    """在子进程中执行单个步骤 , 返回耗时、峰值内存与步骤摘要中的处理统计"""
+    log_file = work_dir / f'bench-{step}.log'
+    cmd = [sys.executable, str(PIPELINE), '-s', step, '-j', '1', '--force', '-q',
+           '--log-file', log_file.name, *pipeline_args]
+    start = time.perf_counter()
+    with open(work_dir / f'bench-{step}.out', 'w', encoding='utf-8') as out:
+        proc = subprocess.Popen(cmd, cwd=work_dir, stdout=out, stderr=subprocess.STDOUT)
+        peak_rss_mb = None
+        if hasattr(os, 'wait4'):
+            _, status, usage = os.wait4(proc.pid, 0)
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            peak_rss_mb = round(usage.ru_maxrss / 1024, 1)  # Linux下ru_maxrss单位为KB
+        else:
+            proc.wait()
+    wall = time.perf_counter() - start
+    summary = step_summary_from_log(log_file, step)
+    ok = proc.returncode == 0 and summary.get('status') == 'ok'
+    stats = {k: v for k, v in summary.items() if k not in ('step', 'status', 'elapsed')}
+    return {
+        'step': step,
+        'status': 'ok' if ok else 'failed',
+        'wall': round(wall, 3),
+        'elapsed': summary.get('elapsed'),
+        'peak_rss_mb': peak_rss_mb,
+        'stats': stats
+    }
+
+def run_dataset(source: Path, steps: list, pipeline_args: list, keep_work: bool = False) -> list:
+    """在临时文件夹中依次执行各步骤（某步骤失败后不再执行后续步骤）"""
+    work_dir = Path(tempfile.mkdtemp(prefix='pipeline-bench-'))
+    try:
+        for name in RAW_FILES:
+            shutil.copy2(source / name, work_dir / name)
+        results = []
+        for step in steps:
+            result = run_step(step, work_dir, pipeline_args)
+            for renamed, produced in MANUAL_RENAMES.items():
+                if (work_dir / produced).exists() and not (work_dir / renamed).exists():
+                    shutil.copy2(work_dir / produced, work_dir / renamed)
+            results.append(result)
+            rss = f"{result['peak_rss_mb']:.0f}MB" if result['peak_rss_mb'] is not None else '-'
+            mark = '✅' if result['status'] == 'ok' else '❌'
+            print(f"  {mark} {step:<4} {result['wall']:>8.2f}s  峰值内存 {rss}")
+            if result['status'] != 'ok':
+                print(f"     日志：{work_dir / ('bench-' + step + '.log')}")
+                keep_work = True
+                break
+        return results
+    finally:
+        if keep_work:
+            print(f"  📁 工作文件夹：{work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+def run_benchmark(rows_list: list, steps: list = None, match_rate: float = 0.9, seed: int = 1,
+                  pipeline_args: list = None, data_dir=None, keep_work: bool = False) -> dict:
+    """执行基准测试 , 返回可保存为JSON的结果"""
+    steps = steps or DEFAULT_STEPS
+    pipeline_args = list(pipeline_args or [])
+    data_dir = Path(data_dir or Path(tempfile.gettempdir()) / 'pipeline-bench-data')
+    result = {
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'match_rate': match_rate,
+        'seed': seed,
+        'pipeline_args': pipeline_args,
+        'runs': []
+    }
+    for rows in rows_list:
+        source = dataset_dir(data_dir, rows, match_rate, seed)
+        print(f"⏱ {rows} 行：{' '.join(steps)}")
+        result['runs'].append({'rows': rows, 'steps': run_dataset(source, steps, pipeline_args, keep_work)})
+    return result
+
+def failed_steps(result: dict) -> list:
+    return [f"{run['rows']} 行 {s['step']}" for run in result['runs'] for s in run['steps'] if s['status'] != 'ok']
+
+def compare(result: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD) -> list:
+    """
+    与基线逐步骤对比（按 行数 + 步骤 对应）, 打印对比表 , 返回回归说明列表
+    """
+    for key in ('match_rate', 'seed', 'pipeline_args'):
+        if baseline.get(key) != result.get(key):
+            print(f"⚠️ 基线的 {key} 不同（基线 {baseline.get(key)} , 本次 {result.get(key)}）, 对比结果仅供参考")
+    base_steps = {(run['rows'], s['step']): s for run in baseline.get('runs', []) for s in run['steps']}
+    regressions = []
+    for run in result['runs']:
+        print(f"\n{run['rows']} 行   {'耗时':>8} {'基线':>8} {'变化':>8}   {'峰值内存':>8} {'基线':>8}")
+        for s in run['steps']:
+            base = base_steps.get((run['rows'], s['step']))
+            if base is None or s['status'] != 'ok' or base.get('status') != 'ok':
+                print(f"{s['step']:<8} {s['wall']:>9.2f}s {'-':>8}")
+                continue
+            change = s['wall'] / base['wall'] - 1 if base['wall'] else 0.0
+            rss, base_rss = s.get('peak_rss_mb'), base.get('peak_rss_mb')
+            print(f"{s['step']:<8} {s['wall']:>9.2f}s {base['wall']:>7.2f}s {change:>+8.1%}   "
+                  f"{rss if rss is not None else '-':>8} {base_rss if base_rss is not None else '-':>8}")
+            if s['wall'] > base['wall'] * (1 + threshold) and s['wall'] - base['wall'] >= MIN_REGRESSION_SECONDS:
+                regressions.append(f"{run['rows']} 行 {s['step']} 耗时 {base['wall']:.2f}s → {s['wall']:.2f}s（{change:+.0%}）")
+            if (rss is not None and base_rss is not None and rss > base_rss * (1 + threshold)
+                    and rss - base_rss >= MIN_REGRESSION_RSS_MB):
+                regressions.append(f"{run['rows']} 行 {s['step']} 峰值内存 {base_rss:.0f}MB → {rss:.0f}MB")
+    return regressions
+
+def save_json(data: dict, path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+
+def load_json(path) -> dict:
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
@@ -0,0 +1,304 @@
+'''
+合成数据生成：列名、列顺序与单元格类型与真实导出文件一致 , 取值分布按实际业务设定
+    易书平台订单表.xlsx                      -- 快递单号为文本 , 约2%为测试订单（快递单号为0）
+    订单中心数据表-易书承接.xlsx              -- 快递单号为数值
+    订单中心数据表-爱阅有约或科图承接.xlsx
+    3513 7月.xlsx / 3404 7月.xlsx            -- 邮政账单（付邮 / 免邮）, 末尾带合计行
+    ems-errordata.xlsx                       -- 错入格口数据
+账单中的快递单号按 match_rate 取自系统订单（3513对应易书承接的微信支付订单 , 即S4筛选后改名的 sys-ispay.xlsx ;
+3404对应平台的免邮订单 , 即S5筛选后改名的 sys-nopay.xlsx）, 其余为系统中不存在的单号
+同一组参数（行数、匹配率、随机种子）生成的文件完全相同；按块生成与写出 , 整表只保留账单抽样需要的几列数组（每行约80字节）
+注意：单个工作表超过1048575行时Excel无法打开 , 流水线仍可正常读取
+'''
+from __future__ import annotations
+import argparse
+import time
+from pathlib import Path
+
+from benchmark import REPO_DIR  # noqa: F401（把仓库根目录加入导入路径）
+from excelIO import lazy_import, write_excel, FrameStream
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+CHUNK_ROWS = 20000
+MONTH_START = '2025-07-01'
+MONTH_DAYS = 31
+
+# ====================== 取值分布 ======================
+"""
+(取值, 权重)；图书馆按订单量从高到低排列（权重近似齐普夫分布）, 城市按人口
+"""
+LIBRARIES = [
+    '广东省立中山图书馆', '佛山市图书馆', '中山纪念图书馆', '广州图书馆', '深圳图书馆', '东莞图书馆',
+    '珠海市图书馆', '江门市图书馆', '惠州慈云图书馆', '汕头市图书馆', '湛江市图书馆', '肇庆市图书馆',
+    '韶关市图书馆', '清远市图书馆', '梅州市剑英图书馆', '河源市图书馆', '阳江市图书馆', '茂名市图书馆',
+    '潮州市图书馆', '揭阳市图书馆', '汕尾市图书馆', '云浮市图书馆', '番禺区图书馆', '南山图书馆',
+    '顺德图书馆', '南海区图书馆'
+]
+LIBRARY_WEIGHTS = [1 / (rank ** 1.1) for rank in range(1, len(LIBRARIES) + 1)]
+CITIES = {
+    '广州市': 18.7, '深圳市': 17.7, '东莞市': 10.5, '佛山市': 9.6, '湛江市': 7.0, '茂名市': 6.2,
+    '惠州市': 6.0, '揭阳市': 5.6, '汕头市': 5.5, '江门市': 4.8, '中山市': 4.4, '肇庆市': 4.1,
+    '清远市': 4.0, '梅州市': 3.9, '韶关市': 2.9, '河源市': 2.8, '汕尾市': 2.7, '阳江市': 2.6,
+    '潮州市': 2.6, '珠海市': 2.4, '云浮市': 2.4
+}
+DISTRICTS = ['城区', '新区', '开发区', '高新区', '东区', '西区', '南区', '北区']
+ROADS = ['人民路', '中山路', '解放路', '建设路', '文明路', '东风路', '环城路', '滨江路', '学府路', '工业大道']
+SURNAMES = list('王李张刘陈杨黄赵吴周徐孙马朱胡郭何林罗高梁郑谢宋唐许韩冯邓曹彭曾萧田董')
+GIVEN_CHARS = list('伟芳娜秀敏静丽强磊军洋勇艳杰娟涛明超霞平刚桂英华玉兰文辉建国志红梅琳晨欣怡浩宇')
+
+REGION_TYPES = (['市内', '省内', '省外'], [0.6, 0.32, 0.08])
+PLATFORM_STATUS = (['已完成', '配送中', '已关闭'], [0.82, 0.1, 0.08])
+PLATFORM_ORDER_TYPES = (['借书', '还书'], [0.62, 0.38])
+CENTER_STATUS = (['已完成', '配送中', '待发货', '已关闭'], [0.78, 0.1, 0.04, 0.08])
+CENTER_ORDER_TYPES = (['快递借书', '快递还书', '自提'], [0.6, 0.25, 0.15])
+POSTAGE_FEES = ([500, 800, 1000, 1200], [0.5, 0.3, 0.15, 0.05])  # 实付金额（分）
+PAY_POSTAGE_RATE = 0.35      # 付邮订单比例
+TEST_ORDER_RATE = 0.02       # 测试订单（快递单号为0）比例
+ERROR_DATA_RATE = 0.01       # 错入格口数据占平台订单的比例
+
+"""
+快递单号号段（13位数字）：平台订单、订单中心订单、账单中平台不存在的单号互不重叠
+"""
+PLATFORM_WAYBILL_BASE = 1100000000000
+CENTER_WAYBILL_BASE = 1200000000000
+UNKNOWN_WAYBILL_BASE = 9800000000000
+
+# ====================== 生成工具 ======================
+def rng_for(seed: int, *stream: int):
+    """按 (随机种子, 表, 块) 派生随机数生成器 , 各块可独立生成且结果固定"""
+    return np.random.default_rng([seed, *stream])
+
+def pick(rng, choices, size):
+    """按权重抽取取值（choices 为 (取值列表, 权重列表)）"""
+    values, weights = choices
+    weights = np.asarray(weights, dtype=float)
+    return np.asarray(values, dtype=object)[rng.choice(len(values), size=size, p=weights / weights.sum())]
+
+def person_names(rng, size):
+    surnames = np.asarray(SURNAMES, dtype=object)[rng.integers(0, len(SURNAMES), size)]
+    first = np.asarray(GIVEN_CHARS, dtype=object)[rng.integers(0, len(GIVEN_CHARS), size)]
+    second = np.asarray(GIVEN_CHARS + [''] * 10, dtype=object)[rng.integers(0, len(GIVEN_CHARS) + 10, size)]
+    return surnames + first + second
+
+def addresses(rng, cities):
+    size = len(cities)
+    districts = np.asarray(DISTRICTS, dtype=object)[rng.integers(0, len(DISTRICTS), size)]
+    roads = np.asarray(ROADS, dtype=object)[rng.integers(0, len(ROADS), size)]
+    numbers = rng.integers(1, 999, size)
+    return [f'广东省{c}{d}{r}{n}号' for c, d, r, n in zip(cities, districts, roads, numbers)]
+
+def month_times(rng, size):
+    """当月内按时间先后排列的时间（精确到秒）"""
+    seconds = np.sort(rng.integers(0, MONTH_DAYS * 86400, size))
+    return np.datetime64(MONTH_START, 's') + seconds.astype('timedelta64[s]')
+
+def chunked(total: int, build):
+    """按 CHUNK_ROWS 逐块调用 build(块序号, 起始行, 结束行) 生成DataFrame"""
+    for index, start in enumerate(range(0, total, CHUNK_ROWS)):
+        yield build(index, start, min(start + CHUNK_ROWS, total))
+
+# ====================== 各表生成 ======================
+class PlatformOrders:
+    """易书平台订单表：先生成全表的付邮/支付类型/快递单号（账单抽样需要）, 其余列按块生成"""
+    COLUMNS = ['快递单号', '借还书订单号', '图书馆名称', '流水订单号', '订单创建时间', '订单状态', '订单类型',
+               '支付类型', '收件人详细地址', '收件人名称', '实付金额-单位为分', '是否需要邮费', '收件市 ', '区域类型']
+    TABLE = 1
+
+    def __init__(self, rows: int, seed: int):
+        self.rows = rows
+        self.seed = seed
+        rng = rng_for(seed, self.TABLE)
+        self.pay_postage = rng.random(rows) < PAY_POSTAGE_RATE
+        # 付邮订单绝大多数为微信支付 , 免邮订单绝大多数为免支付
+        self.wechat = np.where(self.pay_postage, rng.random(rows) < 0.95, rng.random(rows) < 0.1)
+        self.test_order = rng.random(rows) < TEST_ORDER_RATE
+        self.waybills = PLATFORM_WAYBILL_BASE + np.arange(rows, dtype=np.int64) * 10 + rng.integers(0, 10, rows)
+        self.created = month_times(rng, rows)
+
+    def candidates(self, pay_postage: bool = None):
+        """可出现在账单中的订单（不含测试订单）的快递单号 , pay_postage 指定时只取付邮/免邮订单"""
+        selected = ~self.test_order
+        if pay_postage is not None:
+            selected &= self.pay_postage == pay_postage
+        return self.waybills[selected]
+
+    def chunk(self, index, start, end):
+        rng = rng_for(self.seed, self.TABLE, index)
+        size = end - start
+        cities = pick(rng, (list(CITIES), list(CITIES.values())), size)
+        pay_postage = self.pay_postage[start:end]
+        wechat = self.wechat[start:end]
+        fees = np.where(pay_postage & wechat, pick(rng, POSTAGE_FEES, size), 0).astype(np.int64)
+        serials = range(start + 1, end + 1)
+        waybills = [str(w) for w in self.waybills[start:end]]
+        return pd.DataFrame({
+            '快递单号': np.where(self.test_order[start:end], '0', np.asarray(waybills, dtype=object)),
+            '借还书订单号': [f'JH202507{i:08d}' for i in serials],
+            '图书馆名称': pick(rng, (LIBRARIES, LIBRARY_WEIGHTS), size),
+            '流水订单号': [f'LS{i:012d}' for i in serials],
+            '订单创建时间': pd.Series(self.created[start:end]).astype('datetime64[us]'),
+            '订单状态': pick(rng, PLATFORM_STATUS, size),
+            '订单类型': pick(rng, PLATFORM_ORDER_TYPES, size),
+            '支付类型': np.where(wechat, '微信', '免支付').astype(object),
+            '收件人详细地址': addresses(rng, cities),
+            '收件人名称': person_names(rng, size),
+            '实付金额-单位为分': fees,
+            '是否需要邮费': np.where(pay_postage, '付邮', '免邮').astype(object),
+            '收件市 ': cities,  # 导出文件的列名带空格 , 由S1清洗
+            '区域类型': pick(rng, REGION_TYPES, size)
+        })
+
+    def table(self):
+        return FrameStream(self.COLUMNS, self.rows, chunked(self.rows, self.chunk))
+
+class CenterOrders:
+    """订单中心数据表（易书承接 / 爱阅有约或科图承接）：先生成全表的支付类型/快递单号（账单抽样需要）, 其余列按块生成"""
+    COLUMNS = ['借书者id', '快递单号', '发起应用方订单id', '承接应用方订单id', '发起应用名称', '承接应用名称',
+               '所属图书馆名称', '订单类型', '支付订单号', '创建时间', '订单状态', '支付类型', '收件人地址',
+               '收件人姓名', '借书人名称', '应付金额']
+    SOURCE_APPS = (['粤读通', '易书', '爱阅有约', '科图'], [0.4, 0.3, 0.2, 0.1])
+
+    def __init__(self, rows: int, seed: int, table: int, receivers: tuple, waybill_offset: int):
+        self.rows = rows
+        self.seed = seed
+        self.table_id = table
+        self.receivers = receivers
+        rng = rng_for(seed, table)
+        self.wechat = rng.random(rows) < 0.45
+        self.test_order = rng.random(rows) < TEST_ORDER_RATE
+        self.waybills = (CENTER_WAYBILL_BASE + waybill_offset
+                         + np.arange(rows, dtype=np.int64) * 10 + rng.integers(0, 10, rows))
+        self.created = month_times(rng, rows)
+
+    def candidates(self):
+        """微信支付订单（不含测试订单）的快递单号"""
+        return self.waybills[self.wechat & ~self.test_order]
+
+    def chunk(self, index, start, end):
+        rng = rng_for(self.seed, self.table_id, index)
+        size = end - start
+        serials = np.arange(start, end)
+        wechat = self.wechat[start:end]
+        cities = pick(rng, (list(CITIES), list(CITIES.values())), size)
+        names = person_names(rng, size)
+        return pd.DataFrame({
+            '借书者id': [f'U{u:09d}' for u in rng.integers(0, max(self.rows // 3, 1), size)],  # 同一读者多次借书
+            '快递单号': np.where(self.test_order[start:end], 0, self.waybills[start:end]),
+            '发起应用方订单id': [f'F{self.table_id}{i:011d}' for i in serials],
+            '承接应用方订单id': [f'C{self.table_id}{i:011d}' for i in serials],
+            '发起应用名称': pick(rng, self.SOURCE_APPS, size),
+            '承接应用名称': pick(rng, self.receivers, size),
+            '所属图书馆名称': pick(rng, (LIBRARIES, LIBRARY_WEIGHTS), size),
+            '订单类型': pick(rng, CENTER_ORDER_TYPES, size),
+            '支付订单号': [f'P{self.table_id}{i:015d}' for i in serials],
+            '创建时间': pd.Series(self.created[start:end]).astype('datetime64[us]'),
+            '订单状态': pick(rng, CENTER_STATUS, size),
+            '支付类型': np.where(wechat, '微信', '免支付').astype(object),
+            '收件人地址': addresses(rng, cities),
+            '收件人姓名': names,
+            '借书人名称': names,
+            '应付金额': np.where(wechat, pick(rng, POSTAGE_FEES, size) // 100, 0).astype(np.int64)
+        })
+
+    def table(self):
+        return FrameStream(self.COLUMNS, self.rows, chunked(self.rows, self.chunk))
+
+class EmsBill:
+    """邮政账单：快递单号按匹配率取自平台订单 , 顺序打乱；trailer 为 True 时末尾附加合计行"""
+    COLUMNS = ['序号', '产品', '快递单号', '寄件人', '寄达市名称', '大宗客户名称', '收寄时间', '计费重量(克)', '总邮资']
+    PRODUCTS = (['标准快递', '快递包裹'], [0.8, 0.2])
+
+    def __init__(self, candidates, rows: int, match_rate: float, seed: int, table: int, trailer: bool = True):
+        rng = rng_for(seed, table)
+        matched = min(int(round(rows * match_rate)), len(candidates))
+        unknown = rows - matched
+        waybills = np.concatenate([
+            rng.choice(candidates, size=matched, replace=False),
+            UNKNOWN_WAYBILL_BASE + table * 10**9 + np.arange(unknown, dtype=np.int64)
+        ])
+        rng.shuffle(waybills)
+        self.waybills = waybills
+        self.rows = len(waybills)
+        self.seed = seed
+        self.table_id = table
+        self.trailer = trailer
+        self.total_postage = 0.0
+
+    def chunk(self, index, start, end):
+        rng = rng_for(self.seed, self.table_id, index)
+        size = end - start
+        weights = rng.integers(150, 3000, size)
+        # 首重1000克8元 , 续重每1000克2元
+        postage = 8.0 + np.maximum(np.ceil((weights - 1000) / 1000), 0) * 2.0
+        self.total_postage += float(postage.sum())
+        return pd.DataFrame({
+            '序号': np.arange(start + 1, end + 1, dtype=np.int64),
+            '产品': pick(rng, self.PRODUCTS, size),
+            '快递单号': self.waybills[start:end],
+            '寄件人': pick(rng, (LIBRARIES, LIBRARY_WEIGHTS), size),
+            '寄达市名称': pick(rng, (list(CITIES), list(CITIES.values())), size),
+            '大宗客户名称': '广东省佳禾文化发展有限公司',
+            '收寄时间': pd.Series(month_times(rng, size)).astype('datetime64[us]'),
+            '计费重量(克)': weights.astype(np.int64),
+            '总邮资': postage
+        })
+
+    def frames(self):
+        yield from chunked(self.rows, self.chunk)
+        if self.trailer:
+            yield pd.DataFrame({'序号': ['合计'], '总邮资': [round(self.total_postage, 2)]}, columns=self.COLUMNS)
+
+    def table(self):
+        return FrameStream(self.COLUMNS, self.rows + int(self.trailer), self.frames())
+
+# ====================== 生成入口 ======================
+RAW_FILES = [
+    '易书平台订单表.xlsx', '订单中心数据表-易书承接.xlsx', '订单中心数据表-爱阅有约或科图承接.xlsx',
+    '3513 7月.xlsx', '3404 7月.xlsx', 'ems-errordata.xlsx'
+]
+
+def generate(out_dir, rows: int, match_rate: float = 0.9, seed: int = 1, quiet: bool = False) -> list:
+    """
+    生成一组原始导出文件（文件名与每月实际收到的文件相同 , 从S0开始执行）
+    :param rows: 平台订单表与两个订单中心数据表的行数（账单行数与对应的系统订单数相同）
+    :param match_rate: 账单中能在系统订单中找到的快递单号比例
+    :return: 生成的文件路径列表
+    """
+    if not 0 <= match_rate <= 1:
+        raise ValueError(f"匹配率应在0到1之间：{match_rate}")
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    platform = PlatformOrders(rows, seed)
+    yishu = CenterOrders(rows, seed, 2, (['易书'], [1]), 0)
+    aiyue = CenterOrders(rows, seed, 3, (['爱阅有约', '科图'], [0.7, 0.3]), 5 * 10**10)
+    pay_candidates = yishu.candidates()
+    free_candidates = platform.candidates(pay_postage=False)
+    tables = {
+        '易书平台订单表.xlsx': platform.table(),
+        '订单中心数据表-易书承接.xlsx': yishu.table(),
+        '订单中心数据表-爱阅有约或科图承接.xlsx': aiyue.table(),
+        '3513 7月.xlsx': EmsBill(pay_candidates, len(pay_candidates), match_rate, seed, 4).table(),
+        '3404 7月.xlsx': EmsBill(free_candidates, len(free_candidates), match_rate, seed, 5).table(),
+        'ems-errordata.xlsx': EmsBill(platform.candidates(), max(int(rows * ERROR_DATA_RATE), 1),
+                                      match_rate, seed, 6, trailer=False).table()
+    }
+    paths = []
+    for name in RAW_FILES:
+        start = time.perf_counter()
+        path = out_dir / name
+        write_excel(tables[name], path)
+        paths.append(path)
+        if not quiet:
+            print(f"📝 {name}：{tables[name].rows} 行（{time.perf_counter() - start:.1f}秒）")
+    return paths
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="生成流水线基准测试用的合成工作簿")
+    parser.add_argument('rows', type=int, help="平台订单表与订单中心数据表的行数")
+    parser.add_argument('out_dir', help="输出文件夹")
+    parser.add_argument('--match-rate', type=float, default=0.9,
+                        help="账单中能在平台订单中找到的快递单号比例（默认0.9）")
+    parser.add_argument('--seed', type=int, default=1, help="随机种子（默认1）")
+    args = parser.parse_args()
+    generate(args.out_dir, args.rows, args.match_rate, args.seed)
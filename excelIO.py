@@ -0,0 +1,640 @@
+'''
+Excel读取的列式缓存（各脚本共用）
+首次读取某个工作簿的工作表时 , 将完整的解析结果保存为Feather文件（需安装pyarrow , 未安装时不缓存）,
+之后任何脚本再次读取同一内容的工作簿时以内存映射方式加载缓存文件（只取用到的列）, 无需重新解析xlsx
+缓存只使用Feather这类纯数据格式（不使用pickle , 共享文件夹中被替换的缓存文件不会导致执行代码）
+
+缓存位置：工作簿所在目录下的 .excel_cache（环境变量 EXCEL_CACHE_DIR 可指定其他目录）
+缓存键  ：文件内容哈希 + 工作表 + 读取参数（不含usecols , 同一工作表只缓存一份）, 文件内容变化后自动失效
+关闭缓存：环境变量 EXCEL_CACHE=0
+读取引擎：环境变量 EXCEL_ENGINE=auto|calamine|openpyxl|pandas|csv（默认auto）, 各引擎读取结果一致（类型相同）
+引擎对比：py excelIO.py 文件1.xlsx 文件2.xlsx ... （逐个引擎计时并与pandas默认读取结果比对）
+一致性测试：py -m pytest tests （用合成工作簿检查各可用引擎的读取结果与pandas默认读取一致）
+写出    ：write_excel 直接生成工作表XML流式写出 , 内存占用与行数无关 , 表头样式统一
+导入    ：pandas、numpy、openpyxl、pyarrow 均在首次使用时才加载（lazy_import）, 不读写表格的步骤无需等待导入
+内存统计：环境变量 EXCEL_MEM_REPORT=1 时记录加载的表格及各列的内存占用（record_frame / frame_memory_report）
+'''
+from __future__ import annotations
+import os
+import re
+import sys
+import json
+import time
+import html
+import queue
+import hashlib
+import zipfile
+import datetime
+import threading
+import importlib.util
+from pathlib import Path
+
+def lazy_import(name):
+    """
+    延迟导入：返回的模块在首次访问属性时才执行导入
+    （pandas、numpy导入耗时约0.5秒 , 重命名、查看执行计划等步骤不需要加载）
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+def feather_module():
+    """pyarrow.feather（未安装pyarrow时返回None , 不使用缓存）"""
+    if importlib.util.find_spec('pyarrow') is None:
+        return None
+    import pyarrow.feather
+    return pyarrow.feather
+
+# openpyxl.cell.cell.ERROR_CODES
+EXCEL_ERROR_CODES = frozenset(('#NULL!', '#DIV/0!', '#VALUE!', '#REF!', '#NAME?', '#NUM!', '#N/A', '#GETTING_DATA'))
+
+CACHE_DIR_NAME = ".excel_cache"
+CACHE_MAX_AGE_DAYS = 30  # 超过该天数未被读取的缓存文件在写入新缓存时清理
+CACHE_VERSION = 2        # 缓存格式变化时递增 , 使旧缓存失效
+
+_digest_memo = {}  # (路径, 大小, 修改时间) → 内容哈希
+
+# ====================== 读取引擎 ======================
+def read_with_pandas(path, sheet_name=0, dtype=None, usecols=None, **read_kwargs):
+    """pandas默认读取（引擎一致性比对的基准）"""
+    return pd.read_excel(path, sheet_name=sheet_name, dtype=dtype, usecols=usecols, **read_kwargs)
+
+def read_with_calamine(path, sheet_name=0, dtype=None, usecols=None, **read_kwargs):
+    """calamine（Rust实现 , 需安装 python-calamine）"""
+    return pd.read_excel(path, sheet_name=sheet_name, dtype=dtype, usecols=usecols, engine='calamine', **read_kwargs)
+
+def read_with_openpyxl(path, sheet_name=0, dtype=None, usecols=None, **read_kwargs):
+    """
+    openpyxl只读模式按值读取（values_only , 不创建单元格对象）, 单元格转换规则与pandas的openpyxl引擎一致
+    usecols 为列位置或列名列表时逐行只保留这些列（其他列不转换、不保留）; 自定义表头/跳过行等参数交给pandas处理
+    """
+    if read_kwargs:
+        return pd.read_excel(path, sheet_name=sheet_name, dtype=dtype, usecols=usecols, engine='openpyxl', **read_kwargs)
+    from pandas.io.parsers import TextParser
+    projected = isinstance(usecols, (list, tuple)) and all(isinstance(c, (int, str)) for c in usecols)
+    data = list(iter_sheet_rows(path, sheet_name, usecols=usecols if projected else None))
+    if not data:
+        return pd.DataFrame()
+    width = max(len(row) for row in data)
+    data = [row + [""] * (width - len(row)) for row in data]
+    return TextParser(data, header=0, dtype=dtype, usecols=None if projected else usecols).read()
+
+def column_positions(header: list, usecols) -> list:
+    """usecols（列位置或列名列表）对应的列位置（按表格中的顺序 , 与pandas一致）"""
+    positions = set()
+    missing = []
+    for col in usecols:
+        if isinstance(col, int):
+            positions.add(col)
+        elif col in header:
+            positions.add(header.index(col))
+        else:
+            missing.append(col)
+    if missing:
+        raise ValueError(f"Usecols do not match columns, columns expected but not found: {missing}")
+    return sorted(positions)
+
+def iter_sheet_rows(path, sheet_name=0, usecols=None):
+    """
+    逐行读取工作表（含表头行）, 单元格按 convert_value 转换 , 行尾空单元格去除（不补齐）
+    表格末尾的空行不输出（中间的空行在其后出现数据行时再输出）
+    usecols（列位置或列名列表）: 按表头行确定列位置 , 每行只转换、输出这些列
+    """
+    from openpyxl import load_workbook
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        if isinstance(sheet_name, int):
+            ws = wb.worksheets[sheet_name]
+        elif sheet_name in wb.sheetnames:
+            ws = wb[sheet_name]
+        else:
+            raise ValueError(f"Worksheet named '{sheet_name}' not found")
+        ws.reset_dimensions()  # 部分导出文件记录的表格范围不准确
+        positions = None
+        blank_rows = 0
+        for row in ws.iter_rows(values_only=True):
+            if positions is None and usecols is not None:
+                positions = column_positions([convert_value(value) for value in row], usecols)
+            if positions is None:
+                converted = [convert_value(value) for value in row]
+            elif all(value is None or value == "" for value in row):
+                converted = []
+            else:
+                # 其他列有数据的行照常输出（所取的列全为空时以NaN占位 , 与完整读取后再取列的结果一致）
+                converted = [convert_value(row[i]) if i < len(row) else "" for i in positions]
+                if all(isinstance(value, str) and value == "" for value in converted):
+                    converted = [np.nan]
+            while converted and isinstance(converted[-1], str) and converted[-1] == "":
+                converted.pop()
+            if not converted:
+                blank_rows += 1
+                continue
+            for _ in range(blank_rows):
+                yield [np.nan] if positions is not None else []
+            blank_rows = 0
+            yield converted
+    finally:
+        wb.close()
+
+def convert_value(value):
+    """单元格值转换（空值为空字符串、错误值为NaN、整数值的浮点数转为整数）"""
+    if value is None:
+        return ""
+    if type(value) is float:
+        return int(value) if value.is_integer() else value
+    if isinstance(value, str) and value in EXCEL_ERROR_CODES:
+        return np.nan
+    return value
+
+ISO_DATETIME = re.compile(r'^\d{4}-\d{2}-\d{2}( \d{2}:\d{2}:\d{2}(\.\d+)?)?$')
+CSV_NUMBER = re.compile(r'^-?(0|[1-9]\d*)(\.\d+)?$')  # 前导0的文本（如编码）不视为数字
+
+def read_with_csv(path, sheet_name=0, dtype=None, usecols=None, **read_kwargs):
+    """读取同名CSV导出文件（日期文本列转为日期时间 , 与读取xlsx的结果类型一致）"""
+    csv_path = sibling_csv(path)
+    try:
+        df = pd.read_csv(csv_path, dtype=dtype, usecols=usecols, encoding='utf-8-sig', **read_kwargs)
+    except UnicodeDecodeError:
+        df = pd.read_csv(csv_path, dtype=dtype, usecols=usecols, encoding='gbk', **read_kwargs)
+    for col in df.columns:
+        if dtype is not None and (not isinstance(dtype, dict) or col in dtype):
+            continue
+        if df[col].dtype == object or pd.api.types.is_string_dtype(df[col]):
+            values = df[col].dropna().astype(str)
+            if len(values) and values.str.match(ISO_DATETIME).all():
+                df[col] = pd.to_datetime(df[col], format='ISO8601')
+            elif values.str.match(CSV_NUMBER).any():
+                # 数字与文本混合的列（如末尾"合计"行的序号列）, 数字还原为数值
+                df[col] = df[col].astype(object).map(csv_number)
+    return df
+
+def csv_number(value):
+    if isinstance(value, str) and CSV_NUMBER.match(value):
+        number = float(value)
+        return int(number) if number.is_integer() else number
+    return value
+
+def sibling_csv(path) -> Path:
+    return Path(path).with_suffix('.csv')
+
+def csv_available(path, sheet_name=0) -> bool:
+    """同名CSV存在且不比工作簿旧（CSV只对应第一个工作表）"""
+    csv_path = sibling_csv(path)
+    return (sheet_name == 0 and csv_path.exists()
+            and csv_path.stat().st_mtime >= os.stat(path).st_mtime)
+
+READ_ENGINES = {
+    'csv': read_with_csv,
+    'calamine': read_with_calamine,
+    'openpyxl': read_with_openpyxl,
+    'pandas': read_with_pandas
+}
+# auto时按此顺序选择第一个可用的引擎；CSV不保留单元格类型 , 需用引擎对比确认一致后通过 EXCEL_ENGINE=csv 指定
+ENGINE_PREFERENCE = ('calamine', 'openpyxl')
+
+def engine_available(engine, path, sheet_name=0) -> bool:
+    if engine == 'csv':
+        return csv_available(path, sheet_name)
+    if engine == 'calamine':
+        return importlib.util.find_spec('python_calamine') is not None
+    return engine in READ_ENGINES
+
+def resolve_engine(path, sheet_name=0) -> str:
+    """按 EXCEL_ENGINE 选择读取引擎 , 指定的引擎不可用时按auto处理"""
+    configured = os.environ.get('EXCEL_ENGINE', 'auto').lower()
+    if configured != 'auto' and engine_available(configured, path, sheet_name):
+        return configured
+    return next(engine for engine in ENGINE_PREFERENCE if engine_available(engine, path, sheet_name))
+
+def read_excel(path, sheet_name=0, dtype=None, usecols=None, engine=None, **read_kwargs):
+    """按引擎读取单个工作表（engine 为pandas引擎名时直接交给pandas）"""
+    if engine is not None:
+        return pd.read_excel(path, sheet_name=sheet_name, dtype=dtype, usecols=usecols, engine=engine, **read_kwargs)
+    reader = READ_ENGINES[resolve_engine(path, sheet_name)]
+    return reader(path, sheet_name=sheet_name, dtype=dtype, usecols=usecols, **read_kwargs)
+
+# ====================== 列式缓存 ======================
+
+def cache_enabled() -> bool:
+    return os.environ.get('EXCEL_CACHE', '1').lower() not in ('0', 'off', 'false', 'no')
+
+def cache_dir(path) -> Path:
+    return Path(os.environ.get('EXCEL_CACHE_DIR') or Path(path).resolve().parent / CACHE_DIR_NAME)
+
+def content_digest(path) -> str:
+    """文件内容的sha256（同一进程内按 大小+修改时间 缓存）"""
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _digest_memo:
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                sha.update(chunk)
+        _digest_memo[memo_key] = sha.hexdigest()
+    return _digest_memo[memo_key]
+
+def type_name(t) -> str:
+    return getattr(t, '__name__', str(t))
+
+def cache_key(path, sheet_name, dtype, engine, read_kwargs) -> str:
+    """内容哈希 + 工作表 + 读取引擎 + 读取参数（dtype、header等 , 不含usecols：所取的列从同一份缓存中选取）"""
+    if isinstance(dtype, dict):
+        dtype_spec = sorted((str(col), type_name(t)) for col, t in dtype.items())
+    else:
+        dtype_spec = None if dtype is None else type_name(dtype)  # 所有列统一类型（如 dtype=str）
+    options = {
+        'version': CACHE_VERSION,
+        'sheet': sheet_name,
+        'engine': engine,
+        'dtype': dtype_spec,
+        'kwargs': sorted((k, repr(v)) for k, v in read_kwargs.items())
+    }
+    options_hash = hashlib.sha256(json.dumps(options, ensure_ascii=False).encode('utf-8')).hexdigest()[:16]
+    return f"{content_digest(path)}-{options_hash}"
+
+def select_columns(names: list, usecols) -> list:
+    """usecols（列位置或列名列表）对应的列名（按表格中的顺序 , 与pandas一致）"""
+    selected = set()
+    for col in usecols:
+        if isinstance(col, int):
+            if not 0 <= col < len(names):
+                raise ValueError("Defining usecols with out-of-bounds indices is not allowed.")
+            selected.add(names[col])
+        elif col in names:
+            selected.add(col)
+        else:
+            raise ValueError(f"Usecols do not match columns, columns expected but not found: {[col]}")
+    return [name for name in names if name in selected]
+
+def load_cached(path: Path):
+    """以内存映射方式打开缓存文件（不存在返回None , 取列后再转换为DataFrame）; 命中时刷新修改时间用于过期清理"""
+    if not path.exists():
+        return None
+    table = feather_module().read_table(path, memory_map=True)
+    os.utime(path)
+    return table
+
+def store_cached(path: Path, df: pd.DataFrame):
+    """写入缓存文件（先写临时文件再替换 , 并发写入互不影响）; Feather不支持的表格（如混合类型列）不缓存"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    prune(path.parent)
+    tmp_path = path.parent / f'{path.name}.{os.getpid()}.tmp'
+    try:
+        df.reset_index(drop=True).to_feather(tmp_path)
+        os.replace(tmp_path, path)
+    except Exception:
+        if tmp_path.exists():
+            os.remove(tmp_path)
+
+def prune(directory: Path):
+    """清理长期未被读取的缓存文件"""
+    expire_before = time.time() - CACHE_MAX_AGE_DAYS * 86400
+    for entry in directory.iterdir():
+        try:
+            if entry.is_file() and entry.stat().st_mtime < expire_before:
+                entry.unlink()
+        except OSError:
+            pass
+
+def read_excel_cached(path, sheet_name=0, dtype=None, usecols=None, engine=None, **read_kwargs) -> pd.DataFrame:
+    """
+    与 pd.read_excel 用法一致的读取函数（单个工作表）, 按 EXCEL_ENGINE 选择读取引擎 , 解析结果缓存为Feather文件
+    缓存保存整个工作表 , usecols 为列位置或列名列表时从缓存中只取这些列（首次读取解析整表并写入缓存）;
+    不使用缓存时（未安装pyarrow、EXCEL_CACHE=0）usecols 直接交给读取引擎 , 只解析所取的列 ;
+    其他用法（多工作表、自定义usecols）不使用缓存
+    """
+    cacheable = (
+        cache_enabled()
+        and feather_module() is not None
+        and isinstance(sheet_name, (int, str))
+        and (usecols is None or (isinstance(usecols, (list, tuple)) and all(isinstance(c, (int, str)) for c in usecols)))
+        and str(path).lower().endswith(('.xlsx', '.xlsm', '.xls'))
+    )
+    if not cacheable:
+        if not isinstance(sheet_name, (int, str)):
+            return pd.read_excel(path, sheet_name=sheet_name, dtype=dtype, usecols=usecols, engine=engine, **read_kwargs)
+        return read_excel(path, sheet_name=sheet_name, dtype=dtype, usecols=usecols, engine=engine, **read_kwargs)
+
+    engine_name = engine or resolve_engine(path, sheet_name)
+    cache_path = cache_dir(path) / f"{cache_key(path, sheet_name, dtype, engine_name, read_kwargs)}.feather"
+    try:
+        table = load_cached(cache_path)
+    except Exception:
+        table = None  # 缓存文件损坏时重新解析
+    if table is not None:
+        if usecols is not None:
+            table = table.select(select_columns(table.column_names, usecols))
+        return table.to_pandas()
+    df = read_excel(path, sheet_name=sheet_name, dtype=dtype, engine=engine, **read_kwargs)
+    try:
+        store_cached(cache_path, df)
+    except OSError:
+        pass  # 缓存目录不可写时仅跳过缓存
+    return df if usecols is None else df[select_columns(list(df.columns), usecols)]
+
+# ====================== 写出 ======================
+"""
+直接生成工作表XML并流式写入zip（不创建单元格对象）：
+每次转换 WRITE_CHUNK_ROWS 行 , 压缩在后台线程中进行 , 内存占用与行数无关
+字符串以内联字符串写出 , 日期写为Excel序列值并使用日期格式 , 表头使用统一样式（同pandas默认表头）
+"""
+WRITE_CHUNK_ROWS = 10000
+XLSX_STYLE_HEADER, XLSX_STYLE_DATETIME, XLSX_STYLE_DATE = 1, 2, 3
+XLSX_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<numFmts count="2"><numFmt numFmtId="164" formatCode="yyyy-mm-dd hh:mm:ss"/>'
+    '<numFmt numFmtId="165" formatCode="yyyy-mm-dd"/></numFmts>'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="2"><border><left/><right/><top/><bottom/><diagonal/></border>'
+    '<border><left style="thin"/><right style="thin"/><top style="thin"/><bottom style="thin"/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="4"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="1" xfId="0" applyFont="1" applyBorder="1" applyAlignment="1">'
+    '<alignment horizontal="center" vertical="top"/></xf>'
+    '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="165" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+XML_ILLEGAL = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')  # XML不允许的控制字符（写出时去除）
+EXCEL_EPOCH = '1899-12-30'  # Excel日期序列值的起点（1900日期系统）
+
+def xml_text(value: str) -> str:
+    value = XML_ILLEGAL.sub('', value).replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+    if value != value.strip():
+        return f'<is><t xml:space="preserve">{value}</t></is>'
+    return f'<is><t>{value}</t></is>'
+
+def column_letter(index: int) -> str:
+    letters = ''
+    index += 1
+    while index:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+def excel_serial(value) -> float:
+    """日期时间转为Excel序列值（1900日期系统）"""
+    return float((np.datetime64(value, 'us') - np.datetime64(EXCEL_EPOCH)) / np.timedelta64(1, 'D'))
+
+def value_cell(ref: str, value) -> str:
+    """任意类型的单个值生成单元格XML（空值返回空字符串）"""
+    if value is None or value is pd.NaT or (isinstance(value, float) and value != value):
+        return ''
+    if isinstance(value, (bool, np.bool_)):
+        return f'<c r="{ref}" t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, np.integer)):
+        return f'<c r="{ref}"><v>{int(value)}</v></c>'
+    if isinstance(value, (float, np.floating)):
+        if np.isinf(value):
+            return f'<c r="{ref}" t="inlineStr">{xml_text("inf" if value > 0 else "-inf")}</c>'
+        return f'<c r="{ref}"><v>{float(value)!r}</v></c>'
+    if isinstance(value, datetime.datetime):
+        return f'<c r="{ref}" s="{XLSX_STYLE_DATETIME}"><v>{excel_serial(value.replace(tzinfo=None))!r}</v></c>'
+    if isinstance(value, datetime.date):
+        return f'<c r="{ref}" s="{XLSX_STYLE_DATE}"><v>{excel_serial(value)!r}</v></c>'
+    if isinstance(value, datetime.timedelta):
+        return f'<c r="{ref}"><v>{value.total_seconds() / 86400!r}</v></c>'
+    return f'<c r="{ref}" t="inlineStr">{xml_text(str(value))}</c>'
+
+def column_cells(series: pd.Series, letter: str, first_row: int) -> list:
+    """一列数据生成单元格XML列表（数值与日期列按列批量格式化）"""
+    refs = [f'{letter}{r}' for r in range(first_row, first_row + len(series))]
+    missing = series.isna().to_numpy()
+    if pd.api.types.is_datetime64_any_dtype(series):
+        values = series.dt.tz_localize(None) if series.dt.tz is not None else series
+        serials = ((values.to_numpy().astype('datetime64[us]') - np.datetime64(EXCEL_EPOCH)) / np.timedelta64(1, 'D')).tolist()
+        return ['' if m else f'<c r="{ref}" s="{XLSX_STYLE_DATETIME}"><v>{v!r}</v></c>'
+                for ref, v, m in zip(refs, serials, missing)]
+    if pd.api.types.is_bool_dtype(series) and not missing.any():
+        return [f'<c r="{ref}" t="b"><v>{int(v)}</v></c>' for ref, v in zip(refs, series.tolist())]
+    if pd.api.types.is_integer_dtype(series) and not missing.any():
+        return [f'<c r="{ref}"><v>{v}</v></c>' for ref, v in zip(refs, series.tolist())]
+    if pd.api.types.is_float_dtype(series) and not np.isinf(series.to_numpy(dtype=float, na_value=np.nan)).any():
+        return ['' if m else f'<c r="{ref}"><v>{v!r}</v></c>' for ref, v, m in zip(refs, series.tolist(), missing)]
+    return ['' if m else value_cell(ref, v) for ref, v, m in zip(refs, series.tolist(), missing)]
+
+class FrameStream:
+    """
+    按块提供的表格（列名、总行数、逐块的DataFrame）, 供 write_excel 写出无需整体放入内存的大表
+    DataFrame 按 WRITE_CHUNK_ROWS 切块后同样以此形式写出 , 两种方式写出的文件完全相同
+    """
+    def __init__(self, columns, rows, frames):
+        self.columns = list(columns)
+        self.rows = rows
+        self.frames = frames
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame):
+        frames = (df.iloc[start:start + WRITE_CHUNK_ROWS] for start in range(0, len(df), WRITE_CHUNK_ROWS))
+        return cls(df.columns, len(df), frames)
+
+def sheet_chunks(table: FrameStream):
+    """按块生成工作表XML"""
+    letters = [column_letter(i) for i in range(len(table.columns))]
+    last_ref = f'{letters[-1] if letters else "A"}{table.rows + 1}'
+    yield ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+           '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+           f'<dimension ref="A1:{last_ref}"/><sheetData>')
+    header = ''.join(
+        f'<c r="{letter}1" s="{XLSX_STYLE_HEADER}"><v>{name!r}</v></c>'
+        if isinstance(name, (int, float)) and not isinstance(name, bool) and np.isfinite(name)
+        else f'<c r="{letter}1" s="{XLSX_STYLE_HEADER}" t="inlineStr">{xml_text(str(name))}</c>'
+        for letter, name in zip(letters, table.columns))
+    yield f'<row r="1">{header}</row>'
+    first_row = 2
+    for frame in table.frames:
+        for start in range(0, len(frame), WRITE_CHUNK_ROWS):
+            chunk = frame.iloc[start:start + WRITE_CHUNK_ROWS]
+            columns = [column_cells(chunk.iloc[:, i], letter, first_row) for i, letter in enumerate(letters)]
+            yield ''.join(f'<row r="{r}">{"".join(cells)}</row>'
+                          for r, cells in enumerate(zip(*columns), start=first_row))
+            first_row += len(chunk)
+    if first_row - 2 != table.rows:
+        raise ValueError(f"写出行数 {first_row - 2} 与声明的行数 {table.rows} 不一致")
+    yield '</sheetData></worksheet>'
+
+def workbook_parts(sheet_names):
+    """工作簿结构文件（内容类型、关系、工作簿 , 样式）"""
+    sheets = range(1, len(sheet_names) + 1)
+    ns = 'http://schemas.openxmlformats.org'
+    header = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    yield '[Content_Types].xml', (
+        header + f'<Types xmlns="{ns}/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        + ''.join(f'<Override PartName="/xl/worksheets/sheet{i}.xml" '
+                  'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>' for i in sheets)
+        + '</Types>')
+    yield '_rels/.rels', (
+        header + f'<Relationships xmlns="{ns}/package/2006/relationships">'
+        f'<Relationship Id="rId1" Type="{ns}/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>')
+    yield 'xl/workbook.xml', (
+        header + f'<workbook xmlns="{ns}/spreadsheetml/2006/main" xmlns:r="{ns}/officeDocument/2006/relationships"><sheets>'
+        + ''.join(f'<sheet name="{html.escape(name)}" sheetId="{i}" r:id="rId{i}"/>' for i, name in zip(sheets, sheet_names))
+        + '</sheets></workbook>')
+    yield 'xl/_rels/workbook.xml.rels', (
+        header + f'<Relationships xmlns="{ns}/package/2006/relationships">'
+        + ''.join(f'<Relationship Id="rId{i}" Type="{ns}/officeDocument/2006/relationships/worksheet" '
+                  f'Target="worksheets/sheet{i}.xml"/>' for i in sheets)
+        + f'<Relationship Id="rId{len(sheet_names) + 1}" Type="{ns}/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+        '</Relationships>')
+    yield 'xl/styles.xml', XLSX_STYLES
+
+def zip_entry(name):
+    """固定修改时间的zip条目（相同内容写出的文件逐字节相同 , 执行清单可据此跳过下游步骤）"""
+    info = zipfile.ZipInfo(name, date_time=(1980, 1, 1, 0, 0, 0))
+    info.compress_type = zipfile.ZIP_DEFLATED
+    return info
+
+def write_excel(sheets, path, sheet_name='Sheet1'):
+    """
+    流式写出xlsx（不写索引）, 效果同 df.to_excel(path, index=False)
+    :param sheets: DataFrame / FrameStream , 或 {工作表名: DataFrame / FrameStream} 写出多个工作表
+    """
+    if not isinstance(sheets, dict):
+        sheets = {sheet_name: sheets}
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_DEFLATED) as zf:
+            for name, content in workbook_parts(list(sheets)):
+                zf.writestr(zip_entry(name), content)
+            for i, table in enumerate(sheets.values(), start=1):
+                if not isinstance(table, FrameStream):
+                    table = FrameStream.from_frame(table)
+                with zf.open(zip_entry(f'xl/worksheets/sheet{i}.xml'), 'w', force_zip64=True) as stream:
+                    write_in_background(stream, sheet_chunks(table))
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def write_in_background(stream, chunks):
+    """生成XML的同时在后台线程中压缩写入（队列长度有限 , 内存占用固定）"""
+    pending = queue.Queue(maxsize=2)
+    failure = []
+
+    def writer():
+        while (data := pending.get()) is not None:
+            if not failure:
+                try:
+                    stream.write(data)
+                except Exception as e:
+                    failure.append(e)
+
+    thread = threading.Thread(target=writer, daemon=True)
+    thread.start()
+    try:
+        for chunk in chunks:
+            if failure:
+                break
+            pending.put(chunk.encode('utf-8'))
+    finally:
+        pending.put(None)
+        thread.join()
+    if failure:
+        raise failure[0]
+
+# ====================== 内存统计 ======================
+"""
+加载的DataFrame按 memory_usage(deep=True) 记录总占用与各列占用（环境变量 EXCEL_MEM_REPORT=1 时启用 ,
+1.reName.py --mem-report 会自动设置）, 用于找出占用最多的列 , 有针对性地改为category等类型或不读取该列
+"""
+FRAME_MEMORY = []          # [{'label', 'rows', 'bytes', 'columns': [(列名, 类型, 字节), ...]}]
+MEM_REPORT_TOP_COLUMNS = 8  # 每个表格列出的占用最多的列数
+
+def mem_report_enabled() -> bool:
+    return os.environ.get('EXCEL_MEM_REPORT', '0') not in ('', '0')
+
+def record_frame(label: str, df: pd.DataFrame):
+    """记录DataFrame的内存占用（未启用时直接返回 , deep=True 需要逐个计算文本的大小）"""
+    if not mem_report_enabled():
+        return df
+    usage = df.memory_usage(deep=True)  # 第一项为行索引
+    dtypes = ['index'] + [str(dtype) for dtype in df.dtypes]
+    FRAME_MEMORY.append({
+        'label': str(label),
+        'rows': len(df),
+        'bytes': int(usage.sum()),
+        'columns': [(str(name), dtype, int(size)) for name, dtype, size in zip(usage.index, dtypes, usage.tolist())]
+    })
+    return df
+
+def megabytes(size: float) -> str:
+    return f"{size / 2**20:.1f}MB"
+
+def frame_memory_report(entries: list = None, top: int = MEM_REPORT_TOP_COLUMNS) -> str:
+    """各表格的内存占用 , 以及每个表格中占用最多的列（类型、占用、占比、每行字节数）"""
+    entries = FRAME_MEMORY if entries is None else entries
+    lines = []
+    for entry in sorted(entries, key=lambda e: e['bytes'], reverse=True):
+        total, rows = entry['bytes'], entry['rows']
+        lines.append(f"📦 {entry['label']}：{rows} 行 × {len(entry['columns']) - 1} 列 , {megabytes(total)}")
+        columns = sorted(entry['columns'], key=lambda c: c[2], reverse=True)
+        for name, dtype, size in columns[:top]:
+            share = size / total if total else 0.0
+            per_row = size / rows if rows else 0.0
+            lines.append(f"    {name:<20} {dtype:<16} {megabytes(size):>9} {share:>7.1%} {per_row:>8.0f} 字节/行")
+        if len(columns) > top:
+            rest = sum(size for _, _, size in columns[top:])
+            lines.append(f"    其余 {len(columns) - top} 列{'':<14} {'':<16} {megabytes(rest):>9} {rest / total if total else 0.0:>7.1%}")
+    return "\n".join(lines)
+
+# ====================== 引擎对比 ======================
+def check_engines(paths, dtype=None):
+    """
+    用每个可用引擎读取文件 , 与pandas默认读取结果逐列比对（数据与类型）并计时 , 返回是否全部一致
+    """
+    consistent = True
+    fastest, failed = {}, set()
+    for path in paths:
+        print(f"\n📄 {path}")
+        reference = read_with_pandas(path, dtype=dtype)
+        for engine, reader in READ_ENGINES.items():
+            if engine == 'pandas':
+                continue
+            if not engine_available(engine, path):
+                print(f"   ⏭️ {engine:<9} 不可用")
+                continue
+            start = time.time()
+            try:
+                df = reader(path, dtype=dtype)
+                elapsed = time.time() - start
+                pd.testing.assert_frame_equal(df, reference)
+            except Exception as e:
+                consistent = False
+                failed.add(engine)
+                print(f"   ❌ {engine:<9} 结果不一致：{str(e).splitlines()[0]}")
+                continue
+            fastest[engine] = fastest.get(engine, 0) + elapsed
+            print(f"   ✅ {engine:<9} {elapsed:.2f}秒 {df.shape[0]}行×{df.shape[1]}列")
+    candidates = {engine: elapsed for engine, elapsed in fastest.items() if engine not in failed}
+    if candidates:
+        best = min(candidates, key=candidates.get)
+        print(f"\n🏁 最快的一致引擎：{best}（可设置环境变量 EXCEL_ENGINE={best}）")
+    return consistent
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Excel读取引擎对比（计时与结果一致性检查）")
+    parser.add_argument('files', nargs='+', help="需要比对的xlsx文件")
+    parser.add_argument('--str-column', action='append', default=[], metavar='列名',
+                        help="按文本读取的列（如 快递单号 , 可多次指定）, 检查 dtype=str 时的读取结果")
+    args = parser.parse_args()
+    ok = check_engines(args.files, dtype={col: str for col in args.str_column} or None)
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,7 @@
+"""直接执行 pytest 时把仓库根目录加入导入路径（excelIO、benchmark 位于根目录）"""
+import sys
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+if str(REPO_DIR) not in sys.path:
+    sys.path.insert(0, str(REPO_DIR))
@@ -0,0 +1,79 @@
+'''
+读取引擎一致性测试：同一组合成工作簿（benchmark.synthdata）分别用每个可用引擎读取 , 与pandas默认读取结果逐列比对（数据与类型）
+未安装 python-calamine 时跳过 calamine ; CSV引擎读取按Excel「另存为CSV」方式写出的同名CSV（单元格按显示文本）
+运行：py -m pytest tests
+'''
+import pytest
+import pandas as pd
+
+import excelIO
+from benchmark.synthdata import RAW_FILES, generate
+
+ROWS = 300
+ENGINES = [engine for engine in excelIO.READ_ENGINES if engine != 'pandas']
+DTYPES = {'默认类型': None, '快递单号按文本': {'快递单号': str}}
+
+@pytest.fixture(scope='session')
+def workbooks(tmp_path_factory):
+    """生成一组原始导出文件及其同名CSV , 返回 {文件名: 路径}"""
+    paths = generate(tmp_path_factory.mktemp('engines'), ROWS, quiet=True)
+    for path in paths:
+        excelIO.read_with_pandas(path, dtype=str).to_csv(excelIO.sibling_csv(path), index=False, encoding='utf-8-sig')
+    return {path.name: path for path in paths}
+
+def read_or_skip(engine, path, **read_kwargs):
+    if not excelIO.engine_available(engine, path):
+        pytest.skip(f"{engine} 不可用")
+    return excelIO.READ_ENGINES[engine](path, **read_kwargs)
+
+@pytest.mark.parametrize('dtype', DTYPES.values(), ids=list(DTYPES))
+@pytest.mark.parametrize('engine', ENGINES)
+@pytest.mark.parametrize('name', RAW_FILES)
+def test_engine_matches_pandas(workbooks, name, engine, dtype):
+    path = workbooks[name]
+    actual = read_or_skip(engine, path, dtype=dtype)
+    pd.testing.assert_frame_equal(actual, excelIO.read_with_pandas(path, dtype=dtype))
+
+@pytest.mark.parametrize('usecols', [[0, 2, 5], ['快递单号', '创建时间', '应付金额']], ids=['列位置', '列名'])
+@pytest.mark.parametrize('engine', ENGINES)
+def test_engine_usecols_matches_pandas(workbooks, engine, usecols):
+    path = workbooks['订单中心数据表-易书承接.xlsx']
+    actual = read_or_skip(engine, path, usecols=usecols)
+    pd.testing.assert_frame_equal(actual, excelIO.read_with_pandas(path, usecols=usecols))
+
+@pytest.mark.parametrize('usecols', [[0], ['快递单号', '应付金额']], ids=['单列', '列名'])
+def test_openpyxl_usecols_keeps_rows_blank_in_selected_columns(tmp_path, usecols):
+    """只在未选取的列有数据的行（如末尾合计行）与完整读取后再取列的结果一致"""
+    from openpyxl import Workbook
+    wb = Workbook()
+    for row in [['快递单号', '备注', '应付金额'], ['E1', None, 5], [None, None, None], ['E2', None, 7], [None, '合计', None]]:
+        wb.active.append(row)
+    path = tmp_path / 'bill.xlsx'
+    wb.save(path)
+    pd.testing.assert_frame_equal(excelIO.read_with_openpyxl(path, usecols=usecols),
+                                  excelIO.read_with_pandas(path, usecols=usecols))
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_cached_read_matches_pandas(workbooks, engine, tmp_path, monkeypatch):
+    """首次读取（写入缓存）与再次读取（命中缓存）都与pandas默认读取一致 ; 未安装pyarrow时不写缓存"""
+    path = workbooks['订单中心数据表-易书承接.xlsx']
+    if not excelIO.engine_available(engine, path):
+        pytest.skip(f"{engine} 不可用")
+    monkeypatch.setenv('EXCEL_ENGINE', engine)
+    monkeypatch.setenv('EXCEL_CACHE_DIR', str(tmp_path))
+    expected = excelIO.read_with_pandas(path, dtype={'快递单号': str})
+    for _ in range(2):
+        pd.testing.assert_frame_equal(excelIO.read_excel_cached(path, dtype={'快递单号': str}), expected)
+    assert [entry.suffix for entry in tmp_path.iterdir()] == (['.feather'] if excelIO.feather_module() else [])
+
+@pytest.mark.parametrize('usecols', [[0, 2, 5], ['快递单号', '创建时间', '应付金额']], ids=['列位置', '列名'])
+def test_cached_usecols_share_one_entry(workbooks, tmp_path, monkeypatch, usecols):
+    """不同的usecols从同一份整表缓存中取列"""
+    if excelIO.feather_module() is None:
+        pytest.skip("未安装pyarrow , 不使用缓存")
+    path = workbooks['订单中心数据表-易书承接.xlsx']
+    monkeypatch.setenv('EXCEL_CACHE_DIR', str(tmp_path))
+    for columns in (usecols, None, usecols):
+        pd.testing.assert_frame_equal(excelIO.read_excel_cached(path, usecols=columns),
+                                      excelIO.read_with_pandas(path, usecols=columns))
+    assert len(list(tmp_path.iterdir())) == 1